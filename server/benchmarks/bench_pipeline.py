@@ -0,0 +1,67 @@
+"""
+pytest-benchmark suite for the background removal backends.
+
+Same corpus and backends as pipeline_benchmark.py, one benchmark per
+(backend, image). The file name is outside pytest's default test_*.py
+pattern, so a plain `pytest` run never collects it; name the file to run
+it. Skipped unless pytest-benchmark is installed; rembg cases are skipped
+when rembg is missing.
+
+    pytest benchmarks/bench_pipeline.py --benchmark-json=results.json
+    pytest benchmarks/bench_pipeline.py -k simple
+"""
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import pipeline_benchmark as pb  # noqa: E402
+
+# A smaller corpus than the CLI default keeps a full run in minutes on a CPU
+CORPUS = pb.make_corpus(resolutions=(512, 1024), aspects=("1:1", "4:3", "9:16"))
+
+
+@pytest.fixture(scope="module")
+def workdir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("pipeline_benchmark"))
+
+
+@pytest.fixture(scope="module")
+def ormbg(workdir):
+    return pb.ormbg_backend(pb.random_weights(workdir))
+
+
+@pytest.fixture(scope="module")
+def rembg(workdir):
+    pytest.importorskip("rembg")
+    return pb.rembg_backend(workdir)
+
+
+@pytest.fixture(scope="module")
+def simple():
+    return pb.simple_backend()
+
+
+def _run(benchmark, backend, image):
+    result = benchmark.pedantic(backend, args=(image,), rounds=3, warmup_rounds=1)
+    benchmark.extra_info.update({
+        "width": image.width,
+        "height": image.height,
+        "output_bytes": pb.png_size(result),
+        "peak_rss_mb": pb.peak_rss_mb(),
+    })
+
+
+@pytest.mark.parametrize("label,image", CORPUS, ids=[label for label, _ in CORPUS])
+def test_ormbg_process_image(benchmark, ormbg, label, image):
+    _run(benchmark, ormbg, image)
+
+
+@pytest.mark.parametrize("label,image", CORPUS, ids=[label for label, _ in CORPUS])
+def test_rembg_remove(benchmark, rembg, label, image):
+    _run(benchmark, rembg, image)
+
+
+@pytest.mark.parametrize("label,image", CORPUS, ids=[label for label, _ in CORPUS])
+def test_simple_background_removal(benchmark, simple, label, image):
+    _run(benchmark, simple, image)
@@ -0,0 +1,108 @@
+"""
+CPU benchmark for the ORMBG inference graph optimizations.
+
+Compares the eager model against conv-BN fusion, channels_last and the
+traced / torch.compile graphs on the same input, and reports the median
+forward time, the speedup over eager and the largest difference in the mask.
+
+    python benchmarks/compile_benchmark.py --size 1024 --runs 5
+    python benchmarks/compile_benchmark.py --model-path ormbg.pth --modes trace
+
+Random weights are used when no model path is given; timings do not depend
+on the weight values.
+
+Median forward time on one CPU core (torch 2.1, 3 runs), max diff 6e-8:
+
+    variant               512x512          1024x1024
+    eager                 1238 ms  1.00x   4743 ms  1.00x
+    fused                 1019 ms  1.22x   5006 ms  0.95x
+    fused+channels_last    755 ms  1.64x   4039 ms  1.17x
+    trace                  684 ms  1.81x   3966 ms  1.20x
+    compile                   -            4009 ms  1.18x  (126s build)
+"""
+
+import argparse
+import copy
+import os
+import statistics
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ormbg.ormbg import ORMBG  # noqa: E402
+from ormbg.optimize import InferenceGraph  # noqa: E402
+
+VARIANTS = {
+    "fused": ("none", False),
+    "fused+channels_last": ("none", True),
+    "trace": ("trace", True),
+    "compile": ("compile", True),
+}
+
+
+def load_net(model_path):
+    net = ORMBG()
+    if model_path:
+        net.load_state_dict(torch.load(model_path, map_location="cpu"))
+    net.eval()
+    net.inference_only = True
+    return net
+
+
+def time_forward(model, x, runs, warmup):
+    with torch.no_grad():
+        for _ in range(warmup):
+            result = model(x)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = model(x)
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", default=None, help="ORMBG weights (random weights if omitted)")
+    parser.add_argument("--size", type=int, default=1024, help="Square input size")
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--modes", default=",".join(VARIANTS), help="Comma-separated variants to run")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    base = load_net(args.model_path)
+    x = torch.rand(args.batch, 3, args.size, args.size)
+
+    print(f"ORMBG forward, input {tuple(x.shape)}, {torch.get_num_threads()} threads, {args.runs} runs")
+    eager_time, reference = time_forward(base, x, args.runs, args.warmup)
+    print(f"{'eager':<22} {eager_time * 1000:9.1f} ms   1.00x")
+
+    for name in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        if name not in VARIANTS:
+            print(f"⚠️ Unknown variant '{name}', skipping")
+            continue
+        mode, channels_last = VARIANTS[name]
+        start = time.perf_counter()
+        graph = InferenceGraph(copy.deepcopy(base), mode=mode, channels_last=channels_last)
+        graph.warmup(tuple(x.shape))
+        build_time = time.perf_counter() - start
+
+        elapsed, result = time_forward(graph, x, args.runs, args.warmup)
+        max_diff = (result - reference).abs().max().item()
+        note = " (fell back to eager)" if graph.fallbacks else ""
+        print(
+            f"{name:<22} {elapsed * 1000:9.1f} ms   {eager_time / elapsed:.2f}x   "
+            f"max diff {max_diff:.2e}   build {build_time:.1f}s{note}"
+        )
+
+
+if __name__ == "__main__":
+    main()
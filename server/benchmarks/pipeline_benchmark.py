@@ -0,0 +1,252 @@
+"""
+End-to-end benchmark of the background removal backends.
+
+Runs ORMBGProcessor.process_image, the rembg path and the simple threshold
+fallback over a synthetic corpus at several resolutions and aspect ratios,
+and reports p50/p95 latency, images/sec, peak RSS and the PNG size of the
+result for every (backend, image) pair. Results can be saved as JSON and
+compared with an earlier run.
+
+    python benchmarks/pipeline_benchmark.py
+    python benchmarks/pipeline_benchmark.py --backends ormbg --resolutions 1024,2048 --output after.json
+    python benchmarks/pipeline_benchmark.py --compare before.json --output after.json
+
+No download is needed: ORMBG uses random weights unless --model-path is
+given, and the rembg path runs rembg's u2net_custom session on a
+random-weight ORMBG graph exported to ONNX at 320x320 (the resolution rembg
+feeds u2net) unless --rembg-model names a real rembg model. Timings do not
+depend on the weight values. Peak RSS is the process high-water mark, so run
+one backend per process (--backends) to attribute memory.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ormbg.ormbg import ORMBG  # noqa: E402
+from ormbg.ormbg_processor import ORMBGProcessor  # noqa: E402
+from ormbg.samples import synthetic_samples  # noqa: E402
+from simple_removal import simple_background_mask  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BACKENDS = ("ormbg", "rembg", "simple")
+DEFAULT_RESOLUTIONS = (512, 1024, 2048)
+# Width:height; square, landscape photo, portrait photo, widescreen
+DEFAULT_ASPECTS = ("1:1", "4:3", "3:4", "16:9")
+
+
+def parse_aspect(aspect):
+    w, h = aspect.split(":")
+    return int(w), int(h)
+
+
+def corpus_sizes(resolutions, aspects):
+    # (label, (width, height)) with the longest side equal to the resolution
+    sizes = []
+    for resolution in resolutions:
+        for aspect in aspects:
+            aw, ah = parse_aspect(aspect)
+            scale = resolution / max(aw, ah)
+            sizes.append((f"{resolution}@{aspect}", (round(aw * scale), round(ah * scale))))
+    return sizes
+
+
+def make_corpus(resolutions=DEFAULT_RESOLUTIONS, aspects=DEFAULT_ASPECTS, seed=0):
+    sizes = corpus_sizes(resolutions, aspects)
+    images = synthetic_samples(count=len(sizes), seed=seed, sizes=[size for _, size in sizes])
+    return [(label, image) for (label, _), image in zip(sizes, images)]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def png_size(image):
+    with io.BytesIO() as output:
+        image.save(output, format="PNG", compress_level=1)
+        return output.tell()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = (len(ordered) - 1) * pct / 100.0
+    low = int(index)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (index - low)
+
+
+def measure(func, image, runs=5, warmup=1):
+    # Latency summary of func(image) plus the size of its encoded result
+    for _ in range(warmup):
+        result = func(image)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func(image)
+        timings.append(time.perf_counter() - start)
+    return {
+        "runs": runs,
+        "p50_ms": round(percentile(timings, 50) * 1000, 2),
+        "p95_ms": round(percentile(timings, 95) * 1000, 2),
+        "mean_ms": round(statistics.mean(timings) * 1000, 2),
+        "images_per_sec": round(runs / sum(timings), 3),
+        "output_bytes": png_size(result),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def random_weights(directory, seed=0):
+    # State dict of a randomly initialised ORMBG, saved like a downloaded .pth
+    torch.manual_seed(seed)
+    path = os.path.join(directory, "ormbg_random.pth")
+    torch.save(ORMBG().state_dict(), path)
+    return path
+
+
+def ormbg_backend(model_path, input_size=1024, compile_mode="none"):
+    processor = ORMBGProcessor(model_path)
+    if compile_mode != "none":
+        processor.optimize(mode=compile_mode, warmup_sizes=(input_size,))
+    return lambda image: processor.process_image(image, input_size)
+
+
+def rembg_backend(directory, model_name=None, seed=0):
+    # Same call as the server's rembg backend, returning the RGBA cut-out
+    from rembg import new_session, remove
+
+    if model_name:
+        session = new_session(model_name)
+    else:
+        from ormbg.onnx_backend import export_onnx
+
+        torch.manual_seed(seed)
+        net = ORMBG().eval()
+        net.inference_only = True
+        onnx_path = os.path.join(directory, "rembg_random_320.onnx")
+        export_onnx(net, onnx_path, size=320)
+        session = new_session("u2net_custom", model_path=onnx_path)
+    return lambda image: remove(image, session=session)
+
+
+def simple_backend(brightness_threshold=200, color_distance=0, flood_fill=False):
+    # Mirrors simple_background_removal() in the server with its default criteria
+    def run(image):
+        rgba = image.convert("RGBA")
+        rgba.putalpha(simple_background_mask(image, brightness_threshold, color_distance, flood_fill))
+        return rgba
+    return run
+
+
+def load_backend(name, directory, args):
+    if name == "ormbg":
+        model_path = args.model_path or random_weights(directory, args.seed)
+        return ormbg_backend(model_path, args.input_size, args.compile)
+    if name == "rembg":
+        return rembg_backend(directory, args.rembg_model, args.seed)
+    return simple_backend()
+
+
+def compare(results, baseline):
+    # p50 of this run relative to the baseline for every case both contain
+    previous = {(r["backend"], r["image"]): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline['meta'].get('timestamp', 'baseline')}:")
+    for result in results:
+        before = previous.get((result["backend"], result["image"]))
+        if before is None:
+            continue
+        ratio = result["p50_ms"] / before["p50_ms"] if before["p50_ms"] else float("nan")
+        print(
+            f"  {result['backend']:<7} {result['image']:<11} "
+            f"p50 {before['p50_ms']:9.1f} -> {result['p50_ms']:9.1f} ms  ({ratio:.2f}x)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="Comma-separated backends to run")
+    parser.add_argument("--resolutions", default=",".join(map(str, DEFAULT_RESOLUTIONS)),
+                        help="Longest image sides, comma-separated")
+    parser.add_argument("--aspects", default=",".join(DEFAULT_ASPECTS), help="Width:height ratios, comma-separated")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--model-path", default=None, help="ORMBG weights (random weights if omitted)")
+    parser.add_argument("--input-size", type=int, default=1024, help="ORMBG network input size")
+    parser.add_argument("--compile", default="none", choices=("none", "trace", "compile"),
+                        help="ORMBG inference graph mode")
+    parser.add_argument("--rembg-model", default=None,
+                        help="rembg model name, e.g. u2net (random-weight stand-in if omitted)")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare p50 against")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    resolutions = [int(r) for r in args.resolutions.split(",") if r.strip()]
+    aspects = [a.strip() for a in args.aspects.split(",") if a.strip()]
+    corpus = make_corpus(resolutions, aspects, args.seed)
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+            if name not in BACKENDS:
+                print(f"⚠️ Unknown backend '{name}', skipping")
+                continue
+            try:
+                backend = load_backend(name, directory, args)
+            except ImportError as e:
+                print(f"⚠️ {name} unavailable, skipping: {e}")
+                continue
+
+            for label, image in corpus:
+                result = {"backend": name, "image": label, "width": image.width, "height": image.height}
+                result.update(measure(backend, image, args.runs, args.warmup))
+                results.append(result)
+                print(
+                    f"{name:<7} {label:<11} {image.width:>5}x{image.height:<5} "
+                    f"p50 {result['p50_ms']:9.1f} ms  p95 {result['p95_ms']:9.1f} ms  "
+                    f"{result['images_per_sec']:7.2f} img/s  rss {result['peak_rss_mb']} MB  "
+                    f"out {result['output_bytes'] / 1024:.0f} KB"
+                )
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "threads": torch.get_num_threads(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
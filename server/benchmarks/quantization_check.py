@@ -0,0 +1,76 @@
+"""
+Quality and speed check of the INT8 ORMBG model against fp32.
+
+Quantizes the model with the same calibration the server uses, then runs
+both precisions over the sample set and reports per-image mask IoU and
+mean absolute alpha error, plus the average predict_mask time.
+
+    python benchmarks/quantization_check.py --model-path /opt/models/ormbg/ormbg.pth
+    python benchmarks/quantization_check.py --samples-dir ./photos --calibration-dir ./calibration
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ormbg.ormbg_processor import ORMBGProcessor  # noqa: E402
+from ormbg.quantize import compare_masks, mask_iou, mask_mae  # noqa: E402
+from ormbg.samples import load_sample_images, synthetic_samples  # noqa: E402
+
+
+def predict_all(processor, images):
+    start = time.perf_counter()
+    masks = [processor.predict_mask(image) for image in images]
+    return masks, (time.perf_counter() - start) / max(1, len(images))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", default=os.environ.get("ORMBG_MODEL_PATH", "/opt/models/ormbg/ormbg.pth"))
+    parser.add_argument("--samples-dir", default=None, help="Images to evaluate (bundled synthetic set if omitted)")
+    parser.add_argument("--samples", type=int, default=4)
+    parser.add_argument("--calibration-dir", default=None, help="Calibration images (synthetic if omitted)")
+    parser.add_argument("--calibration-samples", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON only")
+    args = parser.parse_args()
+
+    if args.samples_dir:
+        samples = load_sample_images(args.samples_dir, limit=args.samples)
+    else:
+        samples = synthetic_samples(args.samples, seed=1)
+    if args.calibration_dir:
+        calibration = load_sample_images(args.calibration_dir, limit=args.calibration_samples)
+    else:
+        calibration = synthetic_samples(args.calibration_samples, seed=0)
+
+    processor = ORMBGProcessor(args.model_path)
+    fp32_masks, fp32_time = predict_all(processor, samples)
+
+    start = time.perf_counter()
+    processor.quantize(calibration)
+    quantize_time = time.perf_counter() - start
+    int8_masks, int8_time = predict_all(processor, samples)
+
+    summary = compare_masks(fp32_masks, int8_masks)
+    summary.update({
+        "fp32_seconds_per_image": round(fp32_time, 3),
+        "int8_seconds_per_image": round(int8_time, 3),
+        "speedup": round(fp32_time / int8_time, 2),
+        "quantize_seconds": round(quantize_time, 1),
+    })
+
+    if args.json:
+        print(json.dumps(summary))
+        return
+
+    for i, (image, ref, cand) in enumerate(zip(samples, fp32_masks, int8_masks)):
+        print(f"sample {i} {image.size[0]}x{image.size[1]}: IoU {mask_iou(ref, cand):.4f}  MAE {mask_mae(ref, cand):.4f}")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Counter storage for the daily request limits and abuse blocking.
+
+Both stores expose the same small interface. MemoryCounterStore keeps
+everything in this process and is the default for a single replica.
+RedisCounterStore keeps the counters in Redis, so every replica and worker
+sees the same limits: each request is one pipelined MULTI that checks the
+block list and increments the per-IP daily counter (INCR + EXPIRE).
+"""
+
+import ipaddress
+import sys
+import threading
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+# Daily counters are kept this many days for the admin stats, then expire
+KEEP_DAYS = 7
+
+# Busiest IPs tracked per day (and per stripe) for the admin stats
+TOP_N = 10
+
+# Independent locks in the memory store; an IP always maps to the same stripe
+STRIPES = 16
+
+
+def current_day() -> int:
+    """Today's local date as an integer day number (date.toordinal)"""
+    return date.today().toordinal()
+
+
+def pack_ip(ip: str):
+    """Compact dictionary key for an IP: 4/16 packed bytes, or the interned string if not an IP"""
+    try:
+        return ipaddress.ip_address(ip).packed
+    except ValueError:
+        return sys.intern(ip)
+
+
+def unpack_ip(key) -> str:
+    return str(ipaddress.ip_address(key)) if isinstance(key, bytes) else key
+
+
+class _DayBucket:
+    # Counters of one day in one stripe, with its total and top IPs kept current
+    __slots__ = ("counts", "total", "top")
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.top = {}
+
+    def increment(self, ip_key) -> int:
+        count = self.counts.get(ip_key, 0) + 1
+        self.counts[ip_key] = count
+        self.total += 1
+
+        # Counts only grow by one, so an IP outside `top` can never be ahead
+        # of its smallest entry: it gets in as soon as it passes it
+        top = self.top
+        if ip_key in top or len(top) < TOP_N:
+            top[ip_key] = count
+        else:
+            smallest = min(top, key=top.get)
+            if count > top[smallest]:
+                del top[smallest]
+                top[ip_key] = count
+        return count
+
+
+class _Stripe:
+    __slots__ = ("lock", "days", "blocked")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.days = {}
+        self.blocked = set()
+
+
+class MemoryCounterStore:
+    """In-process counters; limits only hold for a single process.
+
+    Counters are bucketed by integer day and keyed by packed IP. IPs are
+    spread over STRIPES independently locked stripes, so concurrent requests
+    rarely wait on each other. A day expires by dropping its bucket, and
+    per-day totals and top IPs are updated on every increment, so the admin
+    stats never scan the counters.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._stripes = [_Stripe() for _ in range(STRIPES)]
+
+    def _stripe(self, ip_key) -> _Stripe:
+        return self._stripes[hash(ip_key) % STRIPES]
+
+    def track(self, ip: str, day: int) -> Tuple[bool, int]:
+        """Increment the day's counter for ip; return (ip is blocked, new count)"""
+        ip_key = pack_ip(ip)
+        stripe = self._stripe(ip_key)
+        with stripe.lock:
+            bucket = stripe.days.get(day)
+            if bucket is None:
+                bucket = stripe.days[day] = _DayBucket()
+                self._expire(stripe, day)
+            return ip_key in stripe.blocked, bucket.increment(ip_key)
+
+    def get_count(self, ip: str, day: int) -> int:
+        ip_key = pack_ip(ip)
+        stripe = self._stripe(ip_key)
+        with stripe.lock:
+            bucket = stripe.days.get(day)
+            return bucket.counts.get(ip_key, 0) if bucket else 0
+
+    def is_blocked(self, ip: str) -> bool:
+        ip_key = pack_ip(ip)
+        stripe = self._stripe(ip_key)
+        with stripe.lock:
+            return ip_key in stripe.blocked
+
+    def block(self, ip: str):
+        ip_key = pack_ip(ip)
+        stripe = self._stripe(ip_key)
+        with stripe.lock:
+            stripe.blocked.add(ip_key)
+
+    def unblock(self, ip: str) -> bool:
+        """Remove ip from the block list; False if it was not blocked"""
+        ip_key = pack_ip(ip)
+        stripe = self._stripe(ip_key)
+        with stripe.lock:
+            if ip_key not in stripe.blocked:
+                return False
+            stripe.blocked.remove(ip_key)
+            return True
+
+    def blocked_ips(self) -> List[str]:
+        blocked = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                blocked.extend(stripe.blocked)
+        return sorted(unpack_ip(ip_key) for ip_key in blocked)
+
+    def day_stats(self, day: int, top_n: int = TOP_N) -> dict:
+        """Distinct IPs, total requests and the busiest IPs for one day"""
+        ips, total, top = 0, 0, []
+        for stripe in self._stripes:
+            with stripe.lock:
+                bucket = stripe.days.get(day)
+                if bucket is not None:
+                    ips += len(bucket.counts)
+                    total += bucket.total
+                    top.extend(bucket.top.items())
+        # The overall top IPs are among the per-stripe top IPs
+        top.sort(key=lambda x: x[1], reverse=True)
+        return {
+            "ips": ips,
+            "total": total,
+            "top": [(unpack_ip(ip_key), count) for ip_key, count in top[:min(top_n, TOP_N)]],
+        }
+
+    @staticmethod
+    def _expire(stripe: _Stripe, today: int):
+        # Drops whole day buckets; there are at most KEEP_DAYS + 1 of them
+        for day in [d for d in stripe.days if d < today - KEEP_DAYS]:
+            del stripe.days[day]
+
+    def cleanup(self, today: int):
+        """Drop counters older than KEEP_DAYS"""
+        for stripe in self._stripes:
+            with stripe.lock:
+                self._expire(stripe, today)
+
+
+class RedisCounterStore:
+    """Counters shared by every replica through Redis.
+
+    `client` can be any redis-py compatible client (a fake server in tests);
+    otherwise one is created from `url`. Keys:
+      {prefix}daily:{day}:{ip}  per-IP counter, expires after KEEP_DAYS
+      {prefix}day:{day}         sorted set of IPs by count, for the admin stats
+      {prefix}total:{day}       total requests that day
+      {prefix}blocked           set of blocked IPs
+    """
+
+    name = "redis"
+
+    def __init__(self, url: Optional[str] = None, client=None, prefix: str = "pixgone:"):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self.client = client
+        self.prefix = prefix
+        self.ttl_seconds = int(timedelta(days=KEEP_DAYS + 1).total_seconds())
+
+    def _key(self, *parts) -> str:
+        return self.prefix + ":".join(str(part) for part in parts)
+
+    def track(self, ip: str, day: int) -> Tuple[bool, int]:
+        """Increment the day's counter for ip; return (ip is blocked, new count).
+
+        One round trip: the block check and the counter updates run in a
+        single MULTI/EXEC pipeline, so concurrent replicas never lose counts.
+        """
+        counter_key = self._key("daily", day, ip)
+        day_key = self._key("day", day)
+        total_key = self._key("total", day)
+
+        pipe = self.client.pipeline(transaction=True)
+        pipe.sismember(self._key("blocked"), ip)
+        pipe.incr(counter_key)
+        pipe.expire(counter_key, self.ttl_seconds)
+        pipe.zincrby(day_key, 1, ip)
+        pipe.expire(day_key, self.ttl_seconds)
+        pipe.incr(total_key)
+        pipe.expire(total_key, self.ttl_seconds)
+        blocked, count = pipe.execute()[:2]
+        return bool(blocked), int(count)
+
+    def get_count(self, ip: str, day: int) -> int:
+        return int(self.client.get(self._key("daily", day, ip)) or 0)
+
+    def is_blocked(self, ip: str) -> bool:
+        return bool(self.client.sismember(self._key("blocked"), ip))
+
+    def block(self, ip: str):
+        self.client.sadd(self._key("blocked"), ip)
+
+    def unblock(self, ip: str) -> bool:
+        return bool(self.client.srem(self._key("blocked"), ip))
+
+    def blocked_ips(self) -> List[str]:
+        return sorted(_decode(ip) for ip in self.client.smembers(self._key("blocked")))
+
+    def day_stats(self, day: int, top_n: int = TOP_N) -> dict:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zcard(self._key("day", day))
+        pipe.get(self._key("total", day))
+        pipe.zrevrange(self._key("day", day), 0, top_n - 1, withscores=True)
+        ips, total, top = pipe.execute()
+        return {
+            "ips": int(ips),
+            "total": int(total or 0),
+            "top": [(_decode(ip), int(count)) for ip, count in top],
+        }
+
+    def cleanup(self, today: int):
+        # Every key carries a TTL, Redis expires old days by itself
+        pass
+
+
+def _decode(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def create_counter_store(redis_url: Optional[str] = None):
+    """Redis store when a URL is configured, in-memory store otherwise"""
+    if redis_url:
+        return RedisCounterStore(url=redis_url)
+    return MemoryCounterStore()
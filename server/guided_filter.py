@@ -0,0 +1,118 @@
+"""
+Edge-aware mask refinement with the fast guided filter (He & Sun, 2015).
+
+The filter fits a local linear model q = a * I + b between the grayscale
+image I and the mask in every window, so mask edges snap to image edges
+while flat regions are smoothed. Box means use cumulative sums, so the cost
+is linear in the pixel count and independent of the radius. The fast
+variant fits a and b on a subsampled copy and only applies them at full
+resolution, in row bands so memory stays bounded.
+"""
+
+import numpy as np
+import torch
+from PIL import Image
+
+from ormbg.upsample import bilinear_bands
+
+
+def _window_sum(x: np.ndarray, r: int, axis: int) -> np.ndarray:
+    # Sum over [i - r, i + r] along one axis, clipped at the borders
+    n = x.shape[axis]
+    prefix = np.cumsum(x, axis=axis, dtype=np.float64)
+    zero_shape = list(x.shape)
+    zero_shape[axis] = 1
+    prefix = np.concatenate([np.zeros(zero_shape), prefix], axis=axis)
+    index = np.arange(n)
+    upper = np.minimum(index + r + 1, n)
+    lower = np.maximum(index - r, 0)
+    return (np.take(prefix, upper, axis=axis) - np.take(prefix, lower, axis=axis)).astype(np.float32)
+
+
+def box_filter(x: np.ndarray, r: int) -> np.ndarray:
+    """Mean over a (2r+1)x(2r+1) window, clipped at the borders, in O(N)"""
+    h, w = x.shape
+    counts = np.minimum(np.arange(h) + r + 1, h) - np.maximum(np.arange(h) - r, 0)
+    counts = np.outer(counts, np.minimum(np.arange(w) + r + 1, w) - np.maximum(np.arange(w) - r, 0))
+    return _window_sum(_window_sum(x, r, 0), r, 1) / counts.astype(np.float32)
+
+
+def _resize(x: np.ndarray, size) -> np.ndarray:
+    return np.array(Image.fromarray(x, mode="F").resize(size, Image.BILINEAR))
+
+
+def guided_coefficients(guide: np.ndarray, src: np.ndarray, radius: int = 8,
+                        eps: float = 1e-3) -> tuple:
+    """Box-filtered linear coefficients (mean_a, mean_b) of `src` against `guide`"""
+    mean_i = box_filter(guide, radius)
+    mean_p = box_filter(src, radius)
+    cov_ip = box_filter(guide * src, radius) - mean_i * mean_p
+    var_i = box_filter(guide * guide, radius) - mean_i * mean_i
+
+    a = cov_ip / (var_i + eps)
+    b = mean_p - a * mean_i
+    return box_filter(a, radius), box_filter(b, radius)
+
+
+def guided_filter(guide: np.ndarray, src: np.ndarray, radius: int = 8, eps: float = 1e-3,
+                  subsample: int = 1) -> np.ndarray:
+    """Filter `src` guided by `guide` (both float32 HxW in 0..1).
+
+    With subsample > 1 the linear coefficients are fitted on a copy that is
+    `subsample` times smaller and bilinearly upsampled (fast guided filter).
+    """
+    h, w = guide.shape
+    if subsample > 1:
+        small_size = (max(1, w // subsample), max(1, h // subsample))
+        guide_small, src_small = _resize(guide, small_size), _resize(src, small_size)
+        radius = max(1, radius // subsample)
+    else:
+        guide_small, src_small = guide, src
+
+    mean_a, mean_b = guided_coefficients(guide_small, src_small, radius, eps)
+    if subsample > 1:
+        mean_a, mean_b = _resize(mean_a, (w, h)), _resize(mean_b, (w, h))
+    return mean_a * guide + mean_b
+
+
+def refine_mask(image: Image.Image, mask: Image.Image, strength: float, radius: int = 8,
+                eps: float = 1e-3, working_size: int = 512,
+                max_bytes: int = 16 * 1024 * 1024) -> Image.Image:
+    """Blend the mask with its guided-filtered version at the image's size.
+
+    `image` is the full-resolution guide; `mask` may be smaller (the model
+    resolution mask). The coefficients are fitted at about `working_size` on
+    the longest side, never above the mask's own resolution, then applied to
+    the full-resolution grayscale image, so edges follow the real pixels
+    rather than an upsampled mask. `strength` is 0 (plain bilinear upscale)
+    to 1 (fully filtered); `radius` is in pixels of the mask passed in.
+    Full-resolution rows are produced in bands whose float temporaries stay
+    under `max_bytes`; only the uint8 result is full size.
+    """
+    w, h = image.size
+    if strength <= 0:
+        return mask if mask.size == (w, h) else mask.resize((w, h), Image.BILINEAR)
+
+    scale = min(1.0, working_size / max(mask.size))
+    small_size = (max(1, round(mask.width * scale)), max(1, round(mask.height * scale)))
+    guide_small = np.asarray(image.convert("L").resize(small_size, Image.BILINEAR), dtype=np.float32) / 255.0
+    src = np.asarray(mask, dtype=np.float32) / 255.0
+    src_small = src if mask.size == small_size else _resize(src, small_size)
+    mean_a, mean_b = guided_coefficients(guide_small, src_small, max(1, round(radius * scale)), eps)
+
+    # q = mean_a * I + mean_b, blended with the bilinear upscale of the mask
+    maps = [torch.from_numpy(mean_a), torch.from_numpy(mean_b)]
+    if strength < 1:
+        maps.append(torch.from_numpy(src))
+    out = np.empty((h, w), dtype=np.uint8)
+    out_t = torch.from_numpy(out)
+    for start, stop, bands in bilinear_bands(maps, w, h, max_bytes, extra_bytes_per_pixel=5):
+        rows = image.crop((0, start, w, stop))
+        if rows.mode != "L":
+            rows = rows.convert("L")
+        guide = torch.from_numpy(np.asarray(rows, dtype=np.float32)).div_(255.0)
+        refined = bands[0].mul_(guide).add_(bands[1])
+        if strength < 1:
+            refined = refined.sub_(bands[2]).mul_(strength).add_(bands[2])
+        out_t[start:stop].copy_(refined.mul_(255.0).add_(0.5).clamp_(0, 255))
+    return Image.fromarray(out, mode="L")
@@ -0,0 +1,97 @@
+"""
+Upload decoding that avoids full-resolution work where it is not needed.
+
+probe_image() parses only the header, so oversized images are rejected
+before a single pixel is decoded. decode_for_model() decodes JPEGs directly
+at a reduced scale with draft() and shrinks other formats with reduce(),
+producing an image just large enough for the network input. When the
+output also needs the full-resolution image, decode_upload() decodes it
+once and derives the model image from it, unless draft() makes the model
+decode a cheap fraction of a full one.
+"""
+
+import io
+import math
+from typing import Optional, Tuple
+
+from PIL import Image
+
+
+class ImageTooLarge(ValueError):
+    """The image header declares more pixels than allowed"""
+
+    def __init__(self, width: int, height: int, max_pixels: int):
+        super().__init__(f"Image is {width}x{height}, more than {max_pixels} pixels")
+        self.width = width
+        self.height = height
+        self.max_pixels = max_pixels
+
+
+def probe_image(image_data: bytes, max_pixels: int) -> Tuple[str, int, int]:
+    """Return (format, width, height) from the header without decoding.
+
+    Raises ImageTooLarge for pixel bombs and ValueError if the data is not
+    an image Pillow can read.
+    """
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            image_format, (width, height) = image.format, image.size
+    except Image.DecompressionBombError:
+        # Pillow's own hard limit, far above any sensible max_pixels
+        raise ImageTooLarge(0, 0, max_pixels)
+    except (OSError, SyntaxError) as e:
+        raise ValueError(f"Unreadable image: {e}")
+
+    if width * height > max_pixels:
+        raise ImageTooLarge(width, height, max_pixels)
+    return image_format, width, height
+
+
+def letterbox_size(width: int, height: int, input_size: int) -> Tuple[int, int]:
+    """Size the image is scaled to when letterboxed into an input_size square"""
+    scale = input_size / max(width, height)
+    return max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))
+
+
+def decode_for_model(image_data: bytes, input_size: int) -> Image.Image:
+    """Decode to RGB at no less than the letterboxed model input size.
+
+    JPEGs are decoded at 1/2, 1/4 or 1/8 scale by libjpeg itself; other
+    formats are decoded fully and box-reduced by an integer factor before
+    the final resize. Images already smaller than the input are untouched.
+    """
+    image = Image.open(io.BytesIO(image_data))
+    box_w, box_h = letterbox_size(image.width, image.height, input_size)
+    if image.format == "JPEG":
+        # draft() picks the smallest DCT scale that still covers the box
+        image.draft("RGB", (box_w, box_h))
+    return _reduce_to_box(image.convert("RGB"), box_w, box_h)
+
+
+def decode_upload(image_data: bytes, input_size: int, need_full: bool) -> Tuple[Image.Image, Optional[Image.Image]]:
+    """Return (model image, full-resolution image or None).
+
+    With need_full, uploads that draft() cannot shrink are decoded once at
+    full size and the model image is reduced from that decode. A JPEG that
+    draft() shrinks is still decoded at reduced scale and the full image is
+    left to decode_full(), since the reduced decode costs a fraction of it.
+    """
+    image = Image.open(io.BytesIO(image_data))
+    box_w, box_h = letterbox_size(image.width, image.height, input_size)
+    draft_applies = image.format == "JPEG" and min(image.width // box_w, image.height // box_h) >= 2
+    if not need_full or draft_applies:
+        return decode_for_model(image_data, input_size), None
+    full = image.convert("RGB")
+    return _reduce_to_box(full, box_w, box_h), full
+
+
+def _reduce_to_box(image: Image.Image, box_w: int, box_h: int) -> Image.Image:
+    factor = min(image.width // box_w, image.height // box_h)
+    if factor >= 2:
+        image = image.reduce(factor)
+    return image
+
+
+def decode_full(image_data: bytes) -> Image.Image:
+    """Full-resolution RGB decode, used for compositing"""
+    return Image.open(io.BytesIO(image_data)).convert("RGB")
@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import torch
+
+
+class MicroBatcher:
+    """Gathers single-image forward passes into one batched forward pass.
+
+    Callers submit a [1,3,H,W] tensor and block until their [1,1,H,W] mask is
+    ready. A background thread collects everything that arrives within
+    `max_wait_ms` of the first request (up to `max_batch_size` images), stacks
+    tensors of the same shape into one [N,3,H,W] batch, runs `forward` once and
+    splits the masks back out to each caller.
+
+    With max_concurrent > 1 (one per worker process when `forward` is a worker
+    pool) finished batches are handed to that many dispatch threads, so the
+    next batch is collected while earlier ones run.
+    """
+
+    def __init__(self, forward, max_batch_size=4, max_wait_ms=10.0, max_concurrent=1):
+        self.forward = forward
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_concurrent = max(1, int(max_concurrent))
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._executor = None
+        if self.max_concurrent > 1:
+            self._executor = ThreadPoolExecutor(self.max_concurrent, thread_name_prefix="ormbg-batch")
+        self._queue = queue.Queue()
+        # Guards _closed with the put that follows the check, so nothing is
+        # ever queued behind the stop marker
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._images = 0
+        self._thread = threading.Thread(target=self._loop, name="ormbg-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, im_tensor):
+        future = Future()
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._queue.put((im_tensor, future))
+        # After close() there is no batching thread left, run inline
+        if closed:
+            return self.forward(im_tensor)
+        return future.result()
+
+    def close(self):
+        # Requests already queued are still served before the thread exits
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "max_concurrent": self.max_concurrent,
+                "batches": self._batches,
+                "images": self._images,
+                "avg_batch_size": round(self._images / self._batches, 2) if self._batches else 0.0,
+            }
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the stop marker back so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+
+            # Only tensors of identical shape can be stacked together
+            groups = {}
+            for im_tensor, future in batch:
+                groups.setdefault(tuple(im_tensor.shape[1:]), []).append((im_tensor, future))
+
+            for items in groups.values():
+                self._dispatch(items)
+
+        # Nothing can be queued after the stop marker; run anything left inline
+        # rather than leave a caller waiting forever
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self._run([item])
+        if self._executor is not None:
+            # Batches already dispatched still run
+            self._executor.shutdown(wait=False)
+
+    def _dispatch(self, items):
+        if self._executor is None:
+            self._run(items)
+            return
+        # Waits for a free slot, so batches keep filling while all are busy
+        self._slots.acquire()
+        self._executor.submit(self._run_slot, items)
+
+    def _run_slot(self, items):
+        try:
+            self._run(items)
+        finally:
+            self._slots.release()
+
+    def _run(self, items):
+        try:
+            stacked = torch.cat([im_tensor for im_tensor, _ in items], dim=0)
+            masks = self.forward(stacked)
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+
+        with self._stats_lock:
+            self._batches += 1
+            self._images += len(items)
+
+        for i, (_, future) in enumerate(items):
+            future.set_result(masks[i:i + 1])
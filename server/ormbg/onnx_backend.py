@@ -0,0 +1,142 @@
+import os
+import time
+
+import numpy as np
+import torch
+
+from .ormbg_processor import ORMBGProcessor
+
+ONNX_OPSET = 17
+
+
+def export_onnx(net, onnx_path, size=1024):
+    # Exports the eval-mode, d1-only graph for a size x size input. Only the
+    # batch axis is dynamic: the exporter cannot compute ceil-mode max-pool
+    # padding for symbolic spatial sizes.
+    net.eval()
+    inference_only = net.inference_only
+    net.inference_only = True
+    tmp_path = f"{onnx_path}.tmp"
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                net,
+                torch.zeros(1, 3, size, size),
+                tmp_path,
+                input_names=["input"],
+                output_names=["mask"],
+                dynamic_axes={"input": {0: "batch"}, "mask": {0: "batch"}},
+                opset_version=ONNX_OPSET,
+                do_constant_folding=True,
+            )
+        os.replace(tmp_path, onnx_path)
+    finally:
+        net.inference_only = inference_only
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return onnx_path
+
+
+def onnx_path_for(onnx_path, size):
+    # The graph has a fixed spatial size, so each input size gets its own file:
+    # ormbg.onnx for 1024, ormbg_768.onnx for 768, ...
+    if size == 1024:
+        return onnx_path
+    root, ext = os.path.splitext(onnx_path)
+    return f"{root}_{size}{ext}"
+
+
+def export_if_stale(net, model_path, onnx_path, size=1024):
+    # Re-export whenever the .pth is newer than the .onnx next to it
+    if os.path.exists(onnx_path) and os.path.getmtime(onnx_path) >= os.path.getmtime(model_path):
+        return False
+    export_onnx(net, onnx_path, size)
+    return True
+
+
+class ORTProcessor(ORMBGProcessor):
+    """ORMBGProcessor that runs the exported ONNX graph on onnxruntime.
+
+    Preprocessing, batching and post-processing are shared with the torch
+    processor; only predict() differs. `onnx_paths` maps each input size to
+    its exported graph; every size holds its own session (and weights). The
+    sessions use all graph optimizations and `num_threads` intra-op threads
+    (0 = onnxruntime default).
+    """
+
+    runtime = "onnxruntime"
+
+    def __init__(self, onnx_paths, num_threads=0, model_version=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.sessions = {
+            size: ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+            for size, path in onnx_paths.items()
+        }
+        self.num_threads = num_threads
+
+        # No torch module: predict() runs the sessions
+        self._init_state(None)
+        if model_version is None:
+            path = onnx_paths[max(onnx_paths)]
+            stat = os.stat(path)
+            model_version = f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+        # onnxruntime output differs from torch in the last bits, keep cache entries apart
+        self.model_version = f"{model_version}:onnx"
+
+    def to(self, device):
+        raise RuntimeError("ORTProcessor only runs on the CPU execution provider")
+
+    def quantize(self, calibration_images, check_images=(), min_iou=0.0):
+        raise RuntimeError("Quantization is only supported by the torch backend")
+
+    def optimize(self, mode="trace", channels_last=True, warmup_sizes=(1024,), warmup_batch_sizes=(1,)):
+        # onnxruntime already optimizes the graph when the session is created;
+        # only run a warmup
+        for size in warmup_sizes:
+            self.predict(torch.zeros(1, 3, size, size))
+
+    def enable_worker_pool(self, num_workers=2, max_batch_size=1, max_size=1024):
+        raise RuntimeError("The worker pool is only supported by the torch backend")
+
+    def enable_profiling(self, sample_rate=1.0, max_samples=1000):
+        raise RuntimeError("Stage profiling is only supported by the torch backend")
+
+    def predict(self, im_tensor):
+        # Runs the session on a [N,3,H,W] batch and returns the d1 masks [N,1,H,W]
+        session = self.sessions.get(im_tensor.shape[-1])
+        if session is None:
+            raise ValueError(f"No ONNX graph exported for input size {im_tensor.shape[-1]}")
+        inputs = np.ascontiguousarray(im_tensor.detach().cpu().numpy(), dtype=np.float32)
+        outputs = session.run(None, {session.get_inputs()[0].name: inputs})
+        return torch.from_numpy(outputs[0])
+
+
+def measure_throughput(processor, size=1024, runs=3):
+    # Images per second of processor.predict() after one warmup pass
+    im_tensor = torch.rand(1, 3, size, size)
+    processor.predict(im_tensor)
+    start = time.perf_counter()
+    for _ in range(runs):
+        processor.predict(im_tensor)
+    return runs / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    # python -m ormbg.onnx_backend /opt/models/ormbg/ormbg.pth [ormbg.onnx]
+    import sys
+
+    from .ormbg import ORMBG
+
+    model_path = sys.argv[1]
+    onnx_path = sys.argv[2] if len(sys.argv) > 2 else f"{os.path.splitext(model_path)[0]}.onnx"
+    net = ORMBG()
+    net.load_state_dict(torch.load(model_path, map_location="cpu"))
+    export_onnx(net, onnx_path)
+    print(f"✅ Exported {model_path} to {onnx_path}")
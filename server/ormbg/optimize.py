@@ -0,0 +1,98 @@
+import threading
+
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+from .ormbg import REBNCONV, myrebnconv
+
+COMPILE_MODES = ("none", "trace", "compile")
+
+
+def fuse_conv_bn(net):
+    # Folds every BatchNorm into the conv before it; the BN becomes an Identity.
+    # Only valid for inference, and the state dict no longer matches the .pth.
+    net.eval()
+    for module in net.modules():
+        if isinstance(module, REBNCONV) and isinstance(module.bn_s1, nn.BatchNorm2d):
+            module.conv_s1 = fuse_conv_bn_eval(module.conv_s1, module.bn_s1)
+            module.bn_s1 = nn.Identity()
+        elif isinstance(module, myrebnconv) and isinstance(module.bn, nn.BatchNorm2d):
+            module.conv = fuse_conv_bn_eval(module.conv, module.bn)
+            module.bn = nn.Identity()
+    return net
+
+
+class InferenceGraph:
+    """Callable that runs the inference-only ORMBG through an optimized graph.
+
+    At construction the BatchNorms are folded into the convs (in place) and
+    the weights are converted to channels_last. Graphs are then built lazily
+    per input shape:
+      - "trace": torch.jit.trace of the eval graph (parameters stay shared)
+      - "compile": torch.compile (needs a working C++ toolchain on CPU)
+      - "none": eager execution of the fused model
+    Any shape whose graph fails to build falls back to eager mode.
+    """
+
+    def __init__(self, net, mode="trace", channels_last=True):
+        if mode not in COMPILE_MODES:
+            raise ValueError(f"Unknown compile mode: {mode}")
+        self.mode = mode
+        self.channels_last = channels_last
+        self.net = fuse_conv_bn(net)
+        self.net.inference_only = True
+        if channels_last:
+            self.net = self.net.to(memory_format=torch.channels_last)
+        self._graphs = {}
+        self._lock = threading.Lock()
+        self._compiled = None
+        self.fallbacks = 0
+
+    def _prepare(self, x):
+        if self.channels_last:
+            return x.contiguous(memory_format=torch.channels_last)
+        return x
+
+    def _build(self, x):
+        if self.mode == "trace":
+            with torch.no_grad():
+                return torch.jit.trace(self.net, x, check_trace=False)
+        if self.mode == "compile":
+            if self._compiled is None:
+                self._compiled = torch.compile(self.net, dynamic=False)
+            # torch.compile is lazy; the first call does the actual compilation
+            with torch.no_grad():
+                self._compiled(x)
+            return self._compiled
+        return self.net
+
+    def graph_for(self, x):
+        key = tuple(x.shape)
+        graph = self._graphs.get(key)
+        if graph is not None:
+            return graph
+
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is None:
+                try:
+                    graph = self._build(x)
+                except Exception as e:
+                    print(f"⚠️ ORMBG {self.mode} failed for input {key}, using eager mode: {e}")
+                    self.fallbacks += 1
+                    graph = self.net
+                self._graphs[key] = graph
+        return graph
+
+    def warmup(self, shape=(1, 3, 1024, 1024)):
+        # Builds the graph for the common shape at load time instead of on the first request
+        x = self._prepare(torch.zeros(shape))
+        with torch.no_grad():
+            self.graph_for(x)(x)
+
+    def __call__(self, x):
+        x = self._prepare(x)
+        with torch.no_grad():
+            result = self.graph_for(x)(x)
+        return result.contiguous()
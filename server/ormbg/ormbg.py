@@ -401,6 +401,9 @@ class ORMBG(nn.Module):
 
         # self.outconv = nn.Conv2d(6*out_ch,out_ch,1)
 
+        # When set, forward() returns only the d1 mask (see forward_d1)
+        self.inference_only = False
+
     def compute_loss(self, predictions, ground_truth):
         loss0, loss = 0.0, 0.0
         for i in range(0, len(predictions)):
@@ -411,6 +414,9 @@ class ORMBG(nn.Module):
 
     def forward(self, x):
 
+        if self.inference_only:
+            return self.forward_d1(x)
+
         hx = x
 
         hxin = self.conv_in(hx)
@@ -482,3 +488,31 @@ class ORMBG(nn.Module):
             F.sigmoid(d5),
             F.sigmoid(d6),
         ], [hx1d, hx2d, hx3d, hx4d, hx5d, hx6]
+
+    def forward_d1(self, x):
+        # Inference only: computes just the d1 side output and drops each
+        # encoder/decoder feature map as soon as the next stage has used it
+
+        hx1 = self.stage1(self.conv_in(x))
+        hx2 = self.stage2(self.pool12(hx1))
+        hx3 = self.stage3(self.pool23(hx2))
+        hx4 = self.stage4(self.pool34(hx3))
+        hx5 = self.stage5(self.pool45(hx4))
+        hx = self.stage6(self.pool56(hx5))
+
+        # -------------------- decoder --------------------
+        hx = self.stage5d(torch.cat((_upsample_like(hx, hx5), hx5), 1))
+        del hx5
+        hx = self.stage4d(torch.cat((_upsample_like(hx, hx4), hx4), 1))
+        del hx4
+        hx = self.stage3d(torch.cat((_upsample_like(hx, hx3), hx3), 1))
+        del hx3
+        hx = self.stage2d(torch.cat((_upsample_like(hx, hx2), hx2), 1))
+        del hx2
+        hx = self.stage1d(torch.cat((_upsample_like(hx, hx1), hx1), 1))
+        del hx1
+
+        # side output
+        d1 = _upsample_like(self.side1(hx), x)
+
+        return F.sigmoid(d1)
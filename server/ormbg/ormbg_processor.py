@@ -1,45 +1,259 @@
+import os
+import threading
+import time
 import torch
-import torch.nn.functional as F
 import numpy as np
 from PIL import Image
 from .ormbg import ORMBG
+from .batching import MicroBatcher
+from .worker_pool import ORMBGWorkerPool
+from .optimize import InferenceGraph
+from .profiling import StageProfiler
+from .quantize import compare_masks, quantize_static
+from .upsample import upsample_to_uint8
 
 class ORMBGProcessor:
+    runtime = "torch"
+    # Cap on float temporaries while scaling the mask to full resolution
+    upsample_max_bytes = 16 * 1024 * 1024
+
     def __init__(self, model_path):
+        net = ORMBG()
+        net.load_state_dict(torch.load(model_path, map_location="cpu"))
+        net.eval()
+        # Only the d1 mask is used, skip the other side outputs
+        net.inference_only = True
+        self._init_state(net)
+        # Changes whenever the weights file is replaced, used in result cache keys
+        stat = os.stat(model_path)
+        self.model_version = f"{os.path.basename(model_path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+    def _init_state(self, net):
+        # Per-instance state used by the shared methods. Subclasses that load
+        # their model differently must call this instead of copying attributes
         self.device = torch.device("cpu")
-        self.net = ORMBG()
-        self.net.load_state_dict(torch.load(model_path, map_location="cpu"))
-        self.net.eval()
+        self.net = net
+        # Callable used for the forward pass, replaced by optimize()
+        self.model = net
+        self.compile_mode = None
+        self.channels_last = False
+        # (batch, 3, size, size) shapes whose graphs optimize() built at load
+        self.warmup_shapes = ()
+        self.precision = "fp32"
+        self.quality = None
+        self.batcher = None
+        self.pool = None
+        # Optional callable(stage, seconds) told how long preprocess, forward
+        # and upsample took for every predict_mask call
+        self.stage_observer = None
+        # Per-RSU-stage timings, see enable_profiling()
+        self.profiler = None
+        # Per-thread input tensors reused across requests, one per input size
+        self._buffers = threading.local()
 
     def to(self, device):
         self.device = torch.device(device)
         self.net.to(self.device)
+        self._buffers = threading.local()
 
-    def process_image(self, image):
-        # Ensure image is in RGB mode
+    def quantize(self, calibration_images, check_images=(), min_iou=0.0):
+        # Static INT8 post-training quantization calibrated on the given images.
+        # The int8 masks are compared with fp32 on check_images; if the mean IoU
+        # is below min_iou the fp32 model is kept. Returns the quality summary.
+        if self.pool is not None or self.compile_mode is not None:
+            raise RuntimeError("quantize() must be called before optimize() and enable_worker_pool()")
+
+        reference = [self.predict_mask(image) for image in check_images]
+        batches = [self.preprocess(image)[0] for image in calibration_images]
+        fp32_model = self.model
+        self.model = quantize_static(self.net, batches)
+
+        quality = None
+        if reference:
+            quality = compare_masks(reference, [self.predict_mask(image) for image in check_images])
+            if quality["iou_mean"] < min_iou:
+                self.model = fp32_model
+                self.quality = quality
+                return quality
+
+        self.net = self.model
+        self.precision = "int8"
+        self.quality = quality
+        self.model_version = f"{self.model_version}:int8"
+        return quality
+
+    def optimize(self, mode="trace", channels_last=True, warmup_sizes=(1024,), warmup_batch_sizes=(1,)):
+        # One-time inference compilation: conv-BN fusion, channels_last and a
+        # traced/compiled graph, falling back to eager mode if compilation fails.
+        # Graphs are per input shape, batch size included, so every (batch,
+        # size) pair micro-batching can produce is built now, not in a request
+        graph = InferenceGraph(self.net, mode=mode, channels_last=channels_last)
+        self.warmup_shapes = tuple(
+            (batch, 3, size, size) for size in warmup_sizes for batch in warmup_batch_sizes
+        )
+        for shape in self.warmup_shapes:
+            graph.warmup(shape)
+        self.net = graph.net
+        self.model = graph
+        self.compile_mode = mode
+        self.channels_last = channels_last
+        self._buffers = threading.local()
+
+    def enable_batching(self, max_batch_size=4, max_wait_ms=10.0):
+        # Concurrent process_image calls at the same input size share one
+        # forward pass. With a worker pool every worker gets a batch at a time
+        if self.batcher is not None:
+            self.batcher.close()
+            self.batcher = None
+        if max_batch_size > 1:
+            max_concurrent = self.pool.num_workers if self.pool is not None else 1
+            self.batcher = MicroBatcher(self.predict, max_batch_size, max_wait_ms, max_concurrent)
+
+    def enable_worker_pool(self, num_workers=2, max_batch_size=1, max_size=1024):
+        # Forward passes run in worker processes that share this model's weights
+        if self.precision == "int8":
+            # Quantized tensors cannot be moved into shared memory
+            raise RuntimeError("The worker pool does not support INT8 models")
+        if self.pool is not None:
+            self.pool.close()
+        # Every worker builds its own graphs, for the shapes it can receive
+        warmup_shapes = [
+            shape for shape in self.warmup_shapes if shape[0] <= max_batch_size and shape[-1] <= max_size
+        ]
+        self.pool = ORMBGWorkerPool(
+            self.net, num_workers, max_batch_size=max_batch_size, max_size=max_size,
+            compile_mode=self.compile_mode, channels_last=self.channels_last, warmup_shapes=warmup_shapes
+        )
+        if self.batcher is not None:
+            # Re-created so it dispatches to every worker
+            self.enable_batching(self.batcher.max_batch_size, self.batcher.max_wait * 1000.0)
+
+    def enable_profiling(self, sample_rate=1.0, max_samples=1000):
+        # Times every encoder/decoder stage and side head on a sample of the
+        # forward passes. Module hooks only fire in eager mode, so sampled
+        # passes run the eager (fused) net and the others keep the traced or
+        # compiled graph. INT8 and the worker pool are refused
+        if self.pool is not None:
+            raise RuntimeError("Stage profiling does not see forward passes in worker processes")
+        if self.precision == "int8":
+            raise RuntimeError("Stage profiling does not support INT8 models")
+        self.disable_profiling()
+        self.profiler = StageProfiler(self.net, sample_rate, max_samples)
+
+    def disable_profiling(self):
+        if self.profiler is not None:
+            self.profiler.close()
+            self.profiler = None
+
+    def close(self):
+        self.disable_profiling()
+        if self.batcher is not None:
+            self.batcher.close()
+            self.batcher = None
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def predict(self, im_tensor):
+        # Runs the network on a [N,3,H,W] batch and returns the d1 masks [N,1,H,W]
+        pool = self.pool
+        if pool is not None:
+            return pool.run(im_tensor)
+        profiler = self.profiler
+        with torch.no_grad():
+            im_tensor = im_tensor.to(self.device, non_blocking=True)
+            if profiler is not None and profiler.should_sample():
+                return profiler.record(self.net, im_tensor)
+            return self.model(im_tensor)
+
+    def input_buffer(self, size):
+        # Reusable [1,3,size,size] input for the calling thread. Callers block
+        # until their forward pass is done (batching and the worker pool copy
+        # the tensor), so the buffer is free again on the thread's next request.
+        # Pinned on CUDA for async host-to-device copies, channels_last when
+        # the optimized graph expects it.
+        buffers = self._buffers.__dict__
+        buf = buffers.get(size)
+        if buf is None:
+            memory_format = torch.channels_last if self.channels_last else torch.contiguous_format
+            buf = torch.empty(1, 3, size, size, pin_memory=self.device.type == "cuda")
+            buf = buf.contiguous(memory_format=memory_format)
+            buffers[size] = buf
+        return buf
+
+    def preprocess(self, image, size=1024, out=None):
+        # RGB image -> normalized [1,3,size,size] float tensor, written into
+        # `out` if given. The image is letterboxed to keep its aspect ratio,
+        # padding with its own edge pixels.
+        # Also returns the (left, top, width, height) box the image occupies.
+        w, h = image.size
+        scale = size / max(w, h)
+        new_w, new_h = max(1, round(w * scale)), max(1, round(h * scale))
+        left, top = (size - new_w) // 2, (size - new_h) // 2
+        if out is None:
+            out = torch.empty(1, 3, size, size)
+
+        # uint8 HWC pixels -> float CHW in a single strided copy, then scale in
+        # place. np.asarray of a PIL image is a read-only view, which torch
+        # warns about; np.array owns a writable copy of the (model-size) pixels
+        im_np = np.array(image.resize((new_w, new_h), Image.BILINEAR))
+        chw = out[0]
+        chw[:, top:top + new_h, left:left + new_w].copy_(torch.from_numpy(im_np).permute(2, 0, 1))
+        chw[:, top:top + new_h, left:left + new_w].div_(255.0)
+
+        # Edge padding, filled from the image border inside the buffer
+        rows = chw[:, top:top + new_h]
+        rows[:, :, :left] = rows[:, :, left:left + 1]
+        rows[:, :, left + new_w:] = rows[:, :, left + new_w - 1:left + new_w]
+        chw[:, :top] = chw[:, top:top + 1]
+        chw[:, top + new_h:] = chw[:, top + new_h - 1:top + new_h]
+        return out, (left, top, new_w, new_h)
+
+    def predict_mask(self, image, size=1024, output_size=None):
+        # Returns the 8-bit alpha mask at output_size (default: the image size),
+        # running the network at a size x size input. output_size lets callers
+        # pass a downscaled decode and still get a full-resolution mask
         if image.mode != "RGB":
             image = image.convert("RGB")
 
         # Preprocess the image
-        w, h = image.size
-        image = image.resize((1024, 1024), Image.BILINEAR)
-        im_np = np.array(image)
-        im_tensor = torch.tensor(im_np, dtype=torch.float32).permute(2, 0, 1).unsqueeze(0)
-        im_tensor = torch.divide(im_tensor, 255.0).to(self.device)
+        started = time.perf_counter()
+        w, h = output_size or image.size
+        im_tensor, (left, top, box_w, box_h) = self.preprocess(image, size, out=self.input_buffer(size))
 
         # Inference
-        with torch.no_grad():
-            result = self.net(im_tensor)
-
-        # Post-process
-        result = result[0][0]  # Take the first element of the output list and the first channel
-        result = F.interpolate(result, size=(h, w), mode="bilinear")
-        result = result.squeeze()
-        result = (result - result.min()) / (result.max() - result.min())
-        
-        # Create mask and apply to original image
-        mask = Image.fromarray((result.cpu().numpy() * 255).astype(np.uint8))
-        new_im = Image.new("RGBA", (w, h), (0, 0, 0, 0))
-        new_im.paste(image.resize((w, h), Image.BILINEAR), mask=mask)
-
-        return new_im
\ No newline at end of file
+        preprocessed = time.perf_counter()
+        batcher = self.batcher
+        if batcher is not None:
+            result = batcher.submit(im_tensor)
+        else:
+            result = self.predict(im_tensor)
+
+        # Post-process: drop the letterbox padding and normalize to 0..255 at
+        # model resolution; bilinear upsampling never leaves the low-res range
+        predicted = time.perf_counter()
+        result = result[0, 0, top:top + box_h, left:left + box_w]
+        low, high = result.min(), result.max()
+        result = (result - low).mul_(255.0 / (high - low))
+
+        # Scale back to the original size in bands, straight into the uint8 mask
+        mask = Image.fromarray(upsample_to_uint8(result, w, h, self.upsample_max_bytes))
+
+        observe = self.stage_observer
+        if observe is not None:
+            observe("preprocess", preprocessed - started)
+            observe("forward", predicted - preprocessed)
+            observe("upsample", time.perf_counter() - predicted)
+        return mask
+
+    def process_image(self, image, size=1024):
+        # Ensure image is in RGB mode
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        # Apply the mask to the original image
+        mask = self.predict_mask(image, size)
+        new_im = Image.new("RGBA", image.size, (0, 0, 0, 0))
+        new_im.paste(image, mask=mask)
+
+        return new_im
@@ -0,0 +1,125 @@
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import torch
+
+# Modules timed by StageProfiler, in execution order
+PROFILED_STAGES = (
+    "conv_in",
+    "stage1", "stage2", "stage3", "stage4", "stage5", "stage6",
+    "stage5d", "stage4d", "stage3d", "stage2d", "stage1d",
+    "side1", "side2", "side3", "side4", "side5", "side6",
+)
+
+
+class StageProfiler:
+    """Wall time and output size of every ORMBG stage, sampled per forward pass.
+
+    Forward pre/post hooks are registered on the encoder stages, the decoder
+    stages and the side heads. Hooks only fire when the eager modules run, so
+    record() must be given the eager net; traced or compiled graphs, ONNX
+    Runtime and worker processes are not profiled. A forward pass is sampled
+    with probability `sample_rate`; hooks on unsampled passes return
+    immediately. The last `max_samples` timings per
+    (input size, stage) are kept for the percentiles.
+    """
+
+    def __init__(self, net, sample_rate=1.0, max_samples=1000):
+        self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+        self.max_samples = max(1, int(max_samples))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._output_bytes = {}
+        self._passes = 0
+        self._handles = []
+        for name in PROFILED_STAGES:
+            module = getattr(net, name, None)
+            if module is None:
+                continue
+            self._handles.append(module.register_forward_pre_hook(self._pre_hook(name)))
+            self._handles.append(module.register_forward_hook(self._post_hook(name)))
+        if not self._handles:
+            raise ValueError("No ORMBG stages found to profile")
+
+    def _pre_hook(self, name):
+        def hook(module, inputs):
+            started = getattr(self._local, "started", None)
+            if started is not None:
+                started[name] = time.perf_counter()
+        return hook
+
+    def _post_hook(self, name):
+        def hook(module, inputs, output):
+            started = getattr(self._local, "started", None)
+            if started is None or name not in started:
+                return
+            if output.is_cuda:
+                torch.cuda.synchronize(output.device)
+            elapsed = time.perf_counter() - started.pop(name)
+            self._local.records.append((name, elapsed, output.numel() * output.element_size()))
+        return hook
+
+    def should_sample(self):
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def record(self, model, im_tensor):
+        # Runs model(im_tensor) with this thread's hooks recording
+        self._local.started = {}
+        self._local.records = []
+        started = time.perf_counter()
+        try:
+            result = model(im_tensor)
+        finally:
+            records = self._local.records
+            self._local.started = None
+            self._local.records = None
+        records.append(("total", time.perf_counter() - started, result.numel() * result.element_size()))
+
+        size = im_tensor.shape[-1]
+        with self._lock:
+            self._passes += 1
+            for name, elapsed, nbytes in records:
+                samples = self._samples.get((size, name))
+                if samples is None:
+                    samples = self._samples[(size, name)] = deque(maxlen=self.max_samples)
+                samples.append(elapsed)
+                self._output_bytes[(size, name)] = nbytes
+        return result
+
+    def stats(self):
+        # Per input size, per stage: sample count, p50/p90/p99/mean in ms and
+        # output bytes, stages in execution order
+        with self._lock:
+            samples = {key: np.array(values) for key, values in self._samples.items()}
+            output_bytes = dict(self._output_bytes)
+            passes = self._passes
+
+        order = {name: i for i, name in enumerate(PROFILED_STAGES + ("total",))}
+        stages = {}
+        for (size, name) in sorted(samples, key=lambda key: (key[0], order[key[1]])):
+            ms = samples[(size, name)] * 1000.0
+            p50, p90, p99 = np.percentile(ms, (50, 90, 99))
+            stages.setdefault(str(size), {})[name] = {
+                "samples": len(ms),
+                "p50_ms": round(float(p50), 3),
+                "p90_ms": round(float(p90), 3),
+                "p99_ms": round(float(p99), 3),
+                "mean_ms": round(float(ms.mean()), 3),
+                "output_bytes": output_bytes[(size, name)],
+            }
+        return {"sample_rate": self.sample_rate, "passes": passes, "input_sizes": stages}
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._output_bytes.clear()
+            self._passes = 0
+
+    def close(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
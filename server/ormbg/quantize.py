@@ -0,0 +1,64 @@
+import copy
+
+import numpy as np
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+PRECISIONS = ("fp32", "int8")
+
+
+def quantization_engine():
+    # x86 combines fbgemm and onednn kernels; older builds only have fbgemm
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            return engine
+    raise RuntimeError("No quantized CPU engine available in this torch build")
+
+
+def quantize_static(net, calibration_batches):
+    # Static post-training INT8 quantization with FX graph mode: conv+BN+ReLU
+    # are fused, observers record activation ranges over the calibration
+    # batches, then the graph is converted to quantized kernels.
+    # Works on a copy; the fp32 net is left untouched.
+    engine = quantization_engine()
+    torch.backends.quantized.engine = engine
+
+    net = copy.deepcopy(net).eval()
+    net.inference_only = True
+    example = calibration_batches[0]
+    prepared = prepare_fx(net, get_default_qconfig_mapping(engine), example_inputs=(example,))
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def mask_iou(reference, candidate, threshold=128):
+    # IoU of the foreground (alpha >= threshold) of two 8-bit masks
+    ref = np.asarray(reference) >= threshold
+    cand = np.asarray(candidate) >= threshold
+    union = np.count_nonzero(ref | cand)
+    if union == 0:
+        return 1.0
+    return np.count_nonzero(ref & cand) / union
+
+
+def mask_mae(reference, candidate):
+    # Mean absolute alpha difference, 0..1
+    diff = np.abs(np.asarray(reference, dtype=np.int16) - np.asarray(candidate, dtype=np.int16))
+    return float(diff.mean()) / 255.0
+
+
+def compare_masks(reference_masks, candidate_masks):
+    # Quality summary of candidate masks against the fp32 reference masks
+    ious = [mask_iou(r, c) for r, c in zip(reference_masks, candidate_masks)]
+    maes = [mask_mae(r, c) for r, c in zip(reference_masks, candidate_masks)]
+    return {
+        "samples": len(ious),
+        "iou_mean": round(float(np.mean(ious)), 4),
+        "iou_min": round(float(np.min(ious)), 4),
+        "mae_mean": round(float(np.mean(maes)), 4),
+        "mae_max": round(float(np.max(maes)), 4),
+    }
@@ -0,0 +1,61 @@
+import os
+import random
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+# Mix of portrait, landscape and square shapes seen in uploads
+SAMPLE_SIZES = [(1024, 1024), (1200, 800), (800, 1200), (1600, 900), (640, 480), (720, 1280)]
+
+
+def synthetic_samples(count=8, seed=0, sizes=SAMPLE_SIZES):
+    # Procedural sample set: a foreground of blurred shapes over a gradient,
+    # noise or flat background. Reproducible for a given seed, so it can ship
+    # with the code instead of a folder of photos. Image i is sizes[i % len(sizes)]
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    images = []
+    for i in range(count):
+        w, h = sizes[i % len(sizes)]
+
+        style = i % 3
+        if style == 0:
+            ramp = np.linspace(0, 1, w, dtype=np.float32)[None, :, None]
+            start = np.array([rng.randint(0, 255) for _ in range(3)], dtype=np.float32)
+            end = np.array([rng.randint(0, 255) for _ in range(3)], dtype=np.float32)
+            background = np.broadcast_to(start + (end - start) * ramp, (h, w, 3))
+        elif style == 1:
+            background = np_rng.integers(0, 256, (h // 8, w // 8, 3)).astype(np.float32)
+            background = np.array(Image.fromarray(background.astype(np.uint8)).resize((w, h), Image.BILINEAR))
+        else:
+            background = np.full((h, w, 3), rng.randint(180, 255), dtype=np.float32)
+        image = Image.fromarray(np.ascontiguousarray(background).astype(np.uint8))
+
+        draw = ImageDraw.Draw(image)
+        cx, cy = w // 2, h // 2
+        for _ in range(rng.randint(2, 5)):
+            rx, ry = rng.randint(w // 10, w // 4), rng.randint(h // 10, h // 3)
+            ox, oy = rng.randint(-w // 8, w // 8), rng.randint(-h // 8, h // 8)
+            color = tuple(rng.randint(0, 255) for _ in range(3))
+            box = [cx + ox - rx, cy + oy - ry, cx + ox + rx, cy + oy + ry]
+            if rng.random() < 0.5:
+                draw.ellipse(box, fill=color)
+            else:
+                draw.rectangle(box, fill=color)
+        images.append(image.filter(ImageFilter.GaussianBlur(1)))
+    return images
+
+
+def load_sample_images(directory, limit=None):
+    # Real photos for calibration / quality checks, in file name order
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        with Image.open(os.path.join(directory, name)) as image:
+            images.append(image.convert("RGB"))
+        if limit is not None and len(images) >= limit:
+            break
+    return images
@@ -0,0 +1,57 @@
+import numpy as np
+import torch
+
+
+def _source_index(out_len, in_len):
+    # Sampling positions of bilinear interpolation with align_corners=False,
+    # the same as F.interpolate: two source indices and the weight of the second
+    scale = in_len / out_len
+    src = ((torch.arange(out_len, dtype=torch.float32) + 0.5) * scale - 0.5).clamp_(min=0)
+    i0 = src.long().clamp_(max=in_len - 1)
+    i1 = (i0 + 1).clamp_(max=in_len - 1)
+    return i0, i1, src - i0
+
+
+def bilinear_bands(maps, width, height, max_bytes=16 * 1024 * 1024, extra_bytes_per_pixel=0):
+    # Bilinear resize of each [h,w] float map in `maps` (sizes may differ) to
+    # height x width, yielded as (start, stop, bands) for consecutive bands of
+    # output rows. Bands are sized so the float temporaries of every map,
+    # plus extra_bytes_per_pixel of the caller's own, stay under max_bytes
+    maps = [m.detach().float().cpu() for m in maps]
+    indices = {}
+    for low in maps:
+        in_h, in_w = low.shape
+        if (in_h, in_w) not in indices:
+            indices[(in_h, in_w)] = _source_index(width, in_w) + _source_index(height, in_h)
+
+    # Per output row and map: two interpolated source rows, the blend and some slack
+    row_bytes = width * (4 * 4 * len(maps) + extra_bytes_per_pixel)
+    band_rows = max(1, min(height, max_bytes // row_bytes))
+    for start in range(0, height, band_rows):
+        stop = min(height, start + band_rows)
+        bands = []
+        for low in maps:
+            x0, x1, fx, y0, y1, fy = indices[tuple(low.shape)]
+            first, last = int(y0[start]), int(y1[stop - 1])
+
+            # Horizontal pass over only the source rows this band needs
+            rows = low[first:last + 1]
+            rows = torch.lerp(rows[:, x0], rows[:, x1], fx)
+
+            # Vertical pass
+            top = rows[y0[start:stop] - first]
+            bottom = rows[y1[start:stop] - first]
+            bands.append(torch.lerp(top, bottom, fy[start:stop, None]))
+        yield start, stop, bands
+
+
+def upsample_to_uint8(low, width, height, max_bytes=16 * 1024 * 1024):
+    # Bilinear resize of a [h,w] float map already scaled to 0..255 into a
+    # new height x width uint8 array. Output rows are produced in bands so
+    # the float temporaries stay under max_bytes however large the image is;
+    # only the uint8 result is full size.
+    out = np.empty((height, width), dtype=np.uint8)
+    out_t = torch.from_numpy(out)
+    for start, stop, (band,) in bilinear_bands([low], width, height, max_bytes):
+        out_t[start:stop].copy_(band.clamp_(0, 255))
+    return out
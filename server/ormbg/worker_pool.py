@@ -0,0 +1,208 @@
+import contextlib
+import math
+import os
+import queue
+import sys
+import threading
+
+import torch
+import torch.multiprocessing as mp
+
+from .optimize import InferenceGraph
+
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+_spawn_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _lean_main():
+    # spawn re-runs the parent's __main__ in every child before the target.
+    # When the server is started as a script that is the whole server (DB,
+    # cleanup thread, Redis client, caches, executor), so while children
+    # start, __main__ points at this module and they only import ormbg
+    with _spawn_lock:
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = sys.modules[__name__]
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main
+
+
+def _worker_main(net, in_buf, out_buf, conn, num_threads, compile_mode, channels_last, warmup_shapes=()):
+    # net is in inference mode and returns only the d1 mask
+    # Each worker gets its own slice of the cores so workers do not oversubscribe
+    torch.set_num_threads(num_threads)
+    net.eval()
+
+    # Compiled graphs cannot be pickled, so each worker builds its own around
+    # the shared (already fused) weights
+    model = InferenceGraph(net, mode=compile_mode, channels_last=channels_last) if compile_mode else net
+    if compile_mode:
+        # Graphs are per shape; build them all before taking jobs
+        for shape in warmup_shapes:
+            model.warmup(shape)
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            shape = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if shape is None:
+            break
+
+        try:
+            im_tensor = in_buf[:math.prod(shape)].view(shape)
+            with torch.no_grad():
+                result = model(im_tensor)
+            out_buf[:result.numel()].copy_(result.reshape(-1))
+            conn.send(("ok", tuple(result.shape)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, ctx, net, max_batch_size, max_size, num_threads, compile_mode=None, channels_last=False,
+                 warmup_shapes=()):
+        # Shared-memory buffers: only the tensor shape travels over the pipe
+        self.in_buf = torch.empty(max_batch_size * 3 * max_size * max_size).share_memory_()
+        self.out_buf = torch.empty(max_batch_size * max_size * max_size).share_memory_()
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(net, self.in_buf, self.out_buf, child_conn, num_threads, compile_mode, channels_last,
+                  tuple(warmup_shapes)),
+            daemon=True,
+        )
+        with _lean_main():
+            self.process.start()
+        child_conn.close()
+
+    def wait_ready(self):
+        # Blocks until the worker has built its graphs
+        status, _ = self.conn.recv()
+        if status != "ready":
+            raise RuntimeError(f"ORMBG worker failed to start: {status}")
+
+    def run(self, im_tensor):
+        n = im_tensor.numel()
+        if n > self.in_buf.numel():
+            raise ValueError(f"Input of shape {tuple(im_tensor.shape)} exceeds the worker buffer")
+        self.in_buf[:n].copy_(im_tensor.reshape(-1))
+        self.conn.send(tuple(im_tensor.shape))
+        status, payload = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"ORMBG worker failed: {payload}")
+        return self.out_buf[:math.prod(payload)].view(payload).clone()
+
+    def close(self, timeout=5.0):
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class ORMBGWorkerPool:
+    """Pool of inference processes sharing one copy of the ORMBG weights.
+
+    The parameters are moved into shared memory once with share_memory(), so
+    every worker maps the same pages instead of loading its own state dict.
+    Each worker has preallocated shared input/output buffers; dispatching a
+    job copies the tensor into the buffer and sends only its shape over a
+    pipe. Intra-op threads are split evenly between the workers.
+    """
+
+    def __init__(self, net, num_workers=2, max_batch_size=1, max_size=1024, threads_per_worker=None,
+                 compile_mode=None, channels_last=False, warmup_shapes=()):
+        self.num_workers = max(1, int(num_workers))
+        self.compile_mode = compile_mode
+        self.channels_last = channels_last
+        self.warmup_shapes = tuple(warmup_shapes)
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_size = int(max_size)
+        self.threads_per_worker = threads_per_worker or max(1, available_cpus() // self.num_workers)
+
+        # spawn avoids forking a parent that already runs OpenMP and server threads
+        self._ctx = mp.get_context("spawn")
+        self._net = net.eval().share_memory()
+        self._lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._workers = []
+        self._closed = False
+        # Workers warm up in parallel; the pool is usable once all are ready
+        for _ in range(self.num_workers):
+            self._workers.append(self._start_worker())
+        for worker in self._workers:
+            worker.wait_ready()
+            self._idle.put(worker)
+
+    def _start_worker(self):
+        return _Worker(
+            self._ctx, self._net, self.max_batch_size, self.max_size, self.threads_per_worker,
+            self.compile_mode, self.channels_last, self.warmup_shapes
+        )
+
+    def run(self, im_tensor):
+        # Runs the network on a [N,3,H,W] batch in a worker and returns d1 [N,1,H,W]
+        worker = self._checkout()
+        try:
+            if not worker.process.is_alive():
+                worker = self._replace(worker)
+            return worker.run(im_tensor)
+        except (EOFError, OSError, BrokenPipeError):
+            # The worker died mid-job; replace it so the pool keeps its size
+            worker = self._replace(worker)
+            raise RuntimeError("ORMBG worker process exited unexpectedly")
+        finally:
+            self._idle.put(worker)
+
+    def _checkout(self):
+        # _closed is re-checked while waiting: a run() that passed the check
+        # just before close() took every idle worker must not wait forever
+        while True:
+            if self._closed:
+                raise RuntimeError("ORMBG worker pool is closed")
+            try:
+                return self._idle.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    def _replace(self, worker):
+        worker.close(timeout=0)
+        replacement = self._start_worker()
+        replacement.wait_ready()
+        with self._lock:
+            self._workers[self._workers.index(worker)] = replacement
+        return replacement
+
+    def stats(self):
+        return {
+            "workers": self.num_workers,
+            "threads_per_worker": self.threads_per_worker,
+            "idle": self._idle.qsize(),
+            "alive": sum(1 for worker in self._workers if worker.process.is_alive()),
+        }
+
+    def close(self, timeout=60.0):
+        # Wait for in-flight jobs to hand their worker back before stopping it
+        self._closed = True
+        for _ in range(self.num_workers):
+            try:
+                self._idle.get(timeout=timeout)
+            except queue.Empty:
+                break
+        with self._lock:
+            for worker in self._workers:
+                worker.close()
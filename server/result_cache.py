@@ -0,0 +1,174 @@
+"""
+Content-addressed cache for background removal results.
+
+Entries are keyed by a hash of the uploaded bytes plus the backend and any
+options that change the mask, and hold the computed 8-bit alpha mask rather
+than the encoded output, so one entry serves every output format.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from PIL import Image
+
+
+def make_cache_key(image_data: bytes, options: dict) -> str:
+    """Hash the upload together with everything that affects the mask"""
+    digest = hashlib.sha256(image_data)
+    digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class MaskCache:
+    """Two-tier mask cache: an in-memory LRU bounded by bytes and an optional disk tier"""
+
+    def __init__(self, max_memory_bytes: int, disk_dir: Optional[str] = None, max_disk_bytes: int = 0):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._hits = {"memory": 0, "disk": 0}
+        self._misses = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        # Oldest files first so they are evicted first
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".png"):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.png")
+
+    def get_memory(self, key: str) -> Optional[Image.Image]:
+        """Memory tier only, cheap enough for the event loop.
+
+        A miss is not counted; callers follow up with get(), which also
+        checks the disk tier.
+        """
+        with self._lock:
+            mask = self._memory.get(key)
+            if mask is not None:
+                self._memory.move_to_end(key)
+                self._hits["memory"] += 1
+            return mask
+
+    def get(self, key: str) -> Tuple[Optional[Image.Image], Optional[str]]:
+        """Return (mask, tier) on a hit or (None, None) on a miss"""
+        with self._lock:
+            mask = self._memory.get(key)
+            if mask is not None:
+                self._memory.move_to_end(key)
+                self._hits["memory"] += 1
+                return mask, "memory"
+            on_disk = self.disk_dir is not None and key in self._disk
+
+        if on_disk:
+            try:
+                with Image.open(self._disk_path(key)) as stored:
+                    mask = stored.copy()
+            except (OSError, ValueError):
+                mask = None
+            if mask is not None:
+                with self._lock:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self._hits["disk"] += 1
+                # Promote to memory for the next hit
+                self._put_memory(key, mask)
+                return mask, "disk"
+
+        with self._lock:
+            self._misses += 1
+        return None, None
+
+    def put(self, key: str, mask: Image.Image):
+        self._put_memory(key, mask)
+        if self.disk_dir:
+            self._put_disk(key, mask)
+
+    def _put_memory(self, key: str, mask: Image.Image):
+        size = mask.width * mask.height
+        if size > self.max_memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= previous.width * previous.height
+            self._memory[key] = mask
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.width * evicted.height
+
+    def _put_disk(self, key: str, mask: Image.Image):
+        with self._lock:
+            if key in self._disk:
+                return
+
+        # Masks compress well; a fast PNG level keeps writes cheap
+        with io.BytesIO() as output:
+            mask.save(output, format="PNG", compress_level=1)
+            data = output.getvalue()
+        if len(data) > self.max_disk_bytes:
+            return
+
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Failed to write cached mask to disk: {e}")
+            return
+
+        evicted = []
+        with self._lock:
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            while self._disk_bytes > self.max_disk_bytes:
+                old_key, old_size = self._disk.popitem(last=False)
+                self._disk_bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._disk_path(old_key))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "disk_enabled": bool(self.disk_dir),
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "hits": dict(self._hits),
+                "misses": self._misses,
+            }
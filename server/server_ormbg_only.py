@@ -1,25 +1,37 @@
 from fastapi import FastAPI, UploadFile, File, Response, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.exception_handlers import http_exception_handler
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from PIL import Image
+import numpy as np
 import io
+import asyncio
 import time
 import os
 import sys
 import json
 from datetime import datetime, timedelta
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import threading
 import urllib.request
+import contextlib
+import functools
 import shutil
-import requests
+import httpx
 import logging
 from typing import Optional
 import sqlite3
 import hashlib
 import hmac
+from result_cache import MaskCache, make_cache_key
+from counter_store import create_counter_store, current_day
+from simple_removal import classify_plain_background, color_key_mask, simple_background_mask
+from image_decode import ImageTooLarge, decode_full, decode_upload, probe_image
+from guided_filter import refine_mask
+from metrics import MetricsRegistry
 
 print("=== Starting PixGone Server ===")
 print(f"Python version: {sys.version}")
@@ -34,6 +46,13 @@ RAILWAY_API_URL = "https://backboard.railway.app/graphql/v2"
 RAILWAY_API_TOKEN = os.getenv("RAILWAY_API_TOKEN")
 RAILWAY_PROJECT_ID = os.getenv("RAILWAY_PROJECT_ID")
 
+# Railway usage is polled in the background; request handlers read the cached snapshot
+try:
+    RAILWAY_POLL_INTERVAL = int(os.environ.get("RAILWAY_POLL_INTERVAL", "300"))  # Seconds between polls
+except ValueError:
+    print(f"⚠️ Invalid RAILWAY_POLL_INTERVAL value: '{os.environ.get('RAILWAY_POLL_INTERVAL')}', using default: 300")
+    RAILWAY_POLL_INTERVAL = 300
+
 # Ko-fi webhook configuration
 KOFI_WEBHOOK_SECRET = os.getenv("KOFI_WEBHOOK_SECRET")
 KOFI_VERIFICATION_TOKEN = os.getenv("KOFI_VERIFICATION_TOKEN")
@@ -49,11 +68,40 @@ RAILWAY_PRICING = {
     "NETWORK_TX_GB": 0.05,  # $0.05 per GB
 }
 
-# Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
+# Shared counter storage for rate limits and abuse blocking. With REDIS_URL
+# set, every replica and worker enforces the same limits; without it the
+# counters live in this process only
+REDIS_URL = os.environ.get("REDIS_URL")
+
+# Initialize rate limiter. Like the counter store it fails open: if Redis is
+# unreachable the per-minute limit falls back to in-memory counters
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=REDIS_URL or "memory://",
+    storage_options={"socket_timeout": 2, "socket_connect_timeout": 2} if REDIS_URL else {},
+    swallow_errors=True,
+    in_memory_fallback_enabled=True
+)
 app = FastAPI()
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+def rate_limit_in_thread(func):
+    """Run slowapi's check for a limited async endpoint in a thread.
+
+    slowapi checks synchronously on the event loop; with Redis that is a
+    network round trip that would stall every other request. Goes between
+    @app.post and @limiter.limit; the wrapped check is then skipped.
+    """
+    if not REDIS_URL:
+        return func
+
+    @functools.wraps(func)
+    async def wrapper(*args, request: Request, **kwargs):
+        if limiter.enabled:
+            await asyncio.to_thread(limiter._check_request_limit, request, func, False)
+            request.state._rate_limiting_complete = True
+        return await func(*args, request=request, **kwargs)
+    return wrapper
 
 # Add CORS middleware with more permissive settings
 app.add_middleware(
@@ -69,6 +117,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-Queue-Wait-Ms", "X-Cache", "X-Cache-Tier", "X-Backend",
+                    "X-Mask-Width", "X-Mask-Height", "X-Encode-Ms", "X-Input-Size"],
 )
 
 print("✅ CORS middleware configured")
@@ -88,10 +138,8 @@ except ValueError:
     print(f"⚠️ Invalid ABUSE_THRESHOLD value: '{os.environ.get('ABUSE_THRESHOLD')}', using default: 100")
     ABUSE_THRESHOLD = 100
 
-# In-memory storage for daily request tracking (use Redis in production)
-daily_requests = defaultdict(int)
-blocked_ips = set()
-storage_lock = threading.Lock()
+# Daily request counters and blocked IPs (Redis when REDIS_URL is set)
+counter_store = create_counter_store(REDIS_URL)
 
 def get_client_ip(request: Request) -> str:
     """Get client IP address, handling proxies"""
@@ -100,48 +148,65 @@ def get_client_ip(request: Request) -> str:
         return forwarded.split(",")[0].strip()
     return request.client.host
 
+async def counter_store_call(func, *args):
+    """Run a counter store method; Redis round trips run in a thread, off the event loop"""
+    if counter_store.name == "memory":
+        return func(*args)
+    return await asyncio.to_thread(func, *args)
+
 def is_ip_blocked(ip: str) -> bool:
     """Check if IP is blocked due to abuse"""
-    with storage_lock:
-        return ip in blocked_ips
-
-def track_daily_request(ip: str) -> bool:
-    """Track daily request and return True if limit exceeded"""
-    with storage_lock:
-        today = datetime.now().strftime("%Y-%m-%d")
-        key = f"{ip}:{today}"
-        daily_requests[key] += 1
-        
-        # Check if IP should be blocked for abuse
-        if daily_requests[key] > ABUSE_THRESHOLD:
-            blocked_ips.add(ip)
-            print(f"🚫 IP {ip} blocked for abuse: {daily_requests[key]} requests today")
-            return True
-        
-        # Check daily limit
-        if daily_requests[key] > DAILY_LIMIT:
-            print(f"⚠️ IP {ip} exceeded daily limit: {daily_requests[key]}/{DAILY_LIMIT}")
-            return True
-        
-        print(f"📊 IP {ip} requests today: {daily_requests[key]}/{DAILY_LIMIT}")
+    try:
+        return counter_store.is_blocked(ip)
+    except Exception as e:
+        print(f"⚠️ Counter store unavailable, not blocking {ip}: {e}")
         return False
 
+def get_daily_count(ip: str) -> int:
+    """Requests made by ip today, 0 if the store is unreachable"""
+    try:
+        return counter_store.get_count(ip, current_day())
+    except Exception as e:
+        print(f"⚠️ Counter store unavailable, no daily count for {ip}: {e}")
+        return 0
+
+def track_daily_request(ip: str) -> tuple:
+    """Track daily request and return (IP blocked, daily limit exceeded).
+
+    The block check and the increment are one store call (one pipelined round
+    trip with Redis). If the store is unreachable the request is let through.
+    """
+    try:
+        blocked, count = counter_store.track(ip, current_day())
+    except Exception as e:
+        print(f"⚠️ Counter store unavailable, not enforcing daily limit for {ip}: {e}")
+        return False, False
+    
+    if blocked:
+        return True, False
+    
+    # Check if IP should be blocked for abuse. If the block cannot be stored
+    # the request still gets the daily limit check below
+    if count > ABUSE_THRESHOLD:
+        try:
+            counter_store.block(ip)
+        except Exception as e:
+            print(f"⚠️ Counter store unavailable, could not block {ip}: {e}")
+        else:
+            print(f"🚫 IP {ip} blocked for abuse: {count} requests today")
+            return True, False
+    
+    # Check daily limit
+    if count > DAILY_LIMIT:
+        print(f"⚠️ IP {ip} exceeded daily limit: {count}/{DAILY_LIMIT}")
+        return False, True
+    
+    print(f"📊 IP {ip} requests today: {count}/{DAILY_LIMIT}")
+    return False, False
+
 def cleanup_old_records():
     """Clean up old daily records (older than 7 days)"""
-    with storage_lock:
-        today = datetime.now()
-        keys_to_remove = []
-        for key in daily_requests.keys():
-            try:
-                ip, date_str = key.split(":", 1)
-                record_date = datetime.strptime(date_str, "%Y-%m-%d")
-                if (today - record_date).days > 7:
-                    keys_to_remove.append(key)
-            except:
-                keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            del daily_requests[key]
+    counter_store.cleanup(current_day())
 
 # Cleanup old records every hour
 def cleanup_scheduler():
@@ -152,7 +217,7 @@ def cleanup_scheduler():
 cleanup_thread = threading.Thread(target=cleanup_scheduler, daemon=True)
 cleanup_thread.start()
 
-print(f"✅ Rate limiting configured: {DAILY_LIMIT} requests/day, {RATE_LIMIT}")
+print(f"✅ Rate limiting configured: {DAILY_LIMIT} requests/day, {RATE_LIMIT}, {'Redis' if REDIS_URL else 'in-memory'} counters")
 
 # Log environment variable status
 print("\n📊 Environment Configuration Status:")
@@ -256,15 +321,10 @@ def get_top_contributors(limit: int = 10) -> list:
         logger.error(f"Error getting top contributors: {e}")
         return []
 
-def is_app_enabled() -> dict:
+def compute_app_status() -> dict:
     """Check if app should be enabled based on costs vs donations"""
     try:
-        current_cost = 0.0
-        if RAILWAY_API_TOKEN and RAILWAY_PROJECT_ID:
-            usage_data = fetch_railway_usage()
-            if usage_data:
-                costs = calculate_costs(usage_data)
-                current_cost = costs.get("total_cost", 0.0)
+        current_cost = cost_snapshot.get()["costs"].get("total_cost", 0.0)
         
         monthly_donations = get_current_month_donations()
         
@@ -294,6 +354,34 @@ def is_app_enabled() -> dict:
             "reason": "Error checking status"
         }
 
+class AppGate:
+    """Precomputed budget gate for the request path.
+
+    The status is recomputed when the cost snapshot refreshes or a donation
+    arrives, so checking it per request is a single attribute read.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.status = None
+        self._lock = threading.Lock()
+
+    def recompute(self) -> dict:
+        with self._lock:
+            status = compute_app_status()
+            # Publish the dict before the flag so readers never see a stale reason
+            self.status = status
+            self.enabled = status["enabled"]
+        if not status["enabled"]:
+            logger.warning(f"App disabled: {status}")
+        return status
+
+app_gate = AppGate()
+
+def is_app_enabled() -> dict:
+    """Current app status from the precomputed gate"""
+    return app_gate.status or app_gate.recompute()
+
 def verify_kofi_webhook(payload: str, signature: str) -> bool:
     """Verify Ko-fi webhook signature"""
     if not KOFI_WEBHOOK_SECRET:
@@ -354,12 +442,12 @@ async def fetch_railway_usage() -> Optional[dict]:
     logger.info(f"Railway API request variables: {variables}")
     
     try:
-        response = requests.post(
-            RAILWAY_API_URL,
-            json={"query": query, "variables": variables},
-            headers=headers,
-            timeout=10
-        )
+        async with httpx.AsyncClient(timeout=10) as client:
+            response = await client.post(
+                RAILWAY_API_URL,
+                json={"query": query, "variables": variables},
+                headers=headers
+            )
         
         logger.info(f"Railway API response status: {response.status_code}")
         
@@ -421,8 +509,78 @@ def calculate_costs(usage_data: list) -> dict:
     logger.info(f"Final calculated costs: {costs}")
     return costs
 
+class CostSnapshot:
+    """Latest Railway cost calculation, refreshed in the background.
+
+    Readers never touch the network; they get the last result and its age.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._costs = {
+            "cpu_cost": 0.0,
+            "memory_cost": 0.0,
+            "network_cost": 0.0,
+            "total_cost": 0.0
+        }
+        self._usage_data_received = False
+        self._fetched_at = None
+        self._last_error = None
+
+    def update(self, usage_data: Optional[list]):
+        with self._lock:
+            self._fetched_at = time.time()
+            if usage_data:
+                self._costs = calculate_costs(usage_data)
+                self._usage_data_received = True
+                self._last_error = None
+            else:
+                # Keep serving the previous costs if a refresh fails
+                self._last_error = "No usage data received"
+
+    def get(self) -> dict:
+        with self._lock:
+            age = time.time() - self._fetched_at if self._fetched_at else None
+            return {
+                "costs": dict(self._costs),
+                "usage_data_received": self._usage_data_received,
+                "fetched_at": datetime.utcfromtimestamp(self._fetched_at).isoformat() if self._fetched_at else None,
+                "age_seconds": round(age, 1) if age is not None else None,
+                "last_error": self._last_error
+            }
+
+cost_snapshot = CostSnapshot()
+
+async def refresh_cost_snapshot():
+    """Fetch Railway usage once and store the calculated costs"""
+    usage_data = await fetch_railway_usage()
+    cost_snapshot.update(usage_data)
+
+async def cost_refresher():
+    """Poll Railway on a fixed interval for the lifetime of the process.
+
+    The app gate is recomputed after every poll, which also picks up the
+    monthly donation reset when Railway is not configured.
+    """
+    while True:
+        if RAILWAY_API_TOKEN and RAILWAY_PROJECT_ID:
+            try:
+                await refresh_cost_snapshot()
+            except Exception as e:
+                logger.error(f"Error refreshing Railway costs: {e}")
+        # SQLite lookup for donations stays off the event loop
+        await asyncio.to_thread(app_gate.recompute)
+        await asyncio.sleep(RAILWAY_POLL_INTERVAL)
+
+@app.on_event("startup")
+async def start_cost_refresher():
+    # Keep a reference so the task is not garbage collected
+    app.state.cost_refresher = asyncio.create_task(cost_refresher())
+    if RAILWAY_API_TOKEN and RAILWAY_PROJECT_ID:
+        print(f"✅ Railway cost refresher started: every {RAILWAY_POLL_INTERVAL}s")
+
 def try_import_ormbg():
-    """Try to import ormbg, return None if failed"""
+    """Try to import ormbg, return a function producing the alpha mask or None if failed"""
     try:
         from rembg import remove, new_session
         print("✅ ormbg imported successfully")
@@ -431,7 +589,7 @@ def try_import_ormbg():
         session = new_session("u2net")
         print("✅ ormbg session created with u2net model")
         
-        return lambda img: remove(img, session=session)
+        return lambda img: remove(img, session=session, only_mask=True)
     except ImportError as e:
         print(f"❌ ormbg import failed: {e}")
         return None
@@ -519,7 +677,7 @@ def download_model_if_needed(model_path):
         return True
 
 def try_import_custom_ormbg():
-    """Try to import custom ORMBG implementation"""
+    """Try to import custom ORMBG implementation, return a loaded ORMBGProcessor or None"""
     try:
         from ormbg import ORMBGProcessor
         print("✅ Custom ORMBG imported successfully")
@@ -533,7 +691,46 @@ def try_import_custom_ormbg():
             return None
         
         processor = ORMBGProcessor(model_path)
-        return processor.process_image
+
+        # Export before quantization/fusion so the ONNX graph is built from the fp32 weights
+        ort_processor = None
+        if ORMBG_BACKEND != "torch":
+            ort_processor = load_ort_processor(processor, model_path)
+
+        if ORMBG_BACKEND == "onnx" and ort_processor is not None:
+            processor = ort_processor
+        else:
+            if ORMBG_PRECISION == "int8":
+                quantize_ormbg(processor)
+            if ORMBG_COMPILE != "none":
+                compile_start = time.time()
+                processor.optimize(mode=ORMBG_COMPILE, channels_last=ORMBG_CHANNELS_LAST,
+                                   warmup_sizes=ORMBG_INPUT_SIZES,
+                                   warmup_batch_sizes=range(1, max(1, ORMBG_MAX_BATCH_SIZE) + 1))
+                print(f"✅ ORMBG inference graph ready ({ORMBG_COMPILE}) in {time.time() - compile_start:.2f} seconds")
+            if ort_processor is not None:
+                processor = choose_faster_runtime(processor, ort_processor)
+
+        processor.upsample_max_bytes = ORMBG_UPSAMPLE_MAX_MB * 1024 * 1024
+        processor.stage_observer = observe_stage
+        if ORMBG_WORKER_PROCESSES > 0 and processor.runtime != "torch":
+            print("⚠️ ORMBG worker pool only supports the torch runtime, running inference in-process")
+        elif ORMBG_WORKER_PROCESSES > 0 and processor.precision == "int8":
+            print("⚠️ ORMBG worker pool does not support INT8 weights, running inference in-process")
+        elif ORMBG_WORKER_PROCESSES > 0:
+            processor.enable_worker_pool(ORMBG_WORKER_PROCESSES, max_batch_size=ORMBG_MAX_BATCH_SIZE,
+                                         max_size=ORMBG_INPUT_SIZES[-1])
+            print(f"✅ ORMBG worker pool started: {processor.pool.stats()}")
+        if ORMBG_PROFILE_SAMPLE_RATE > 0:
+            try:
+                processor.enable_profiling(ORMBG_PROFILE_SAMPLE_RATE)
+                print(f"✅ ORMBG stage profiling enabled on {ORMBG_PROFILE_SAMPLE_RATE:.0%} of forward passes")
+            except RuntimeError as e:
+                print(f"⚠️ ORMBG stage profiling disabled: {e}")
+        if ORMBG_MAX_BATCH_SIZE > 1:
+            processor.enable_batching(ORMBG_MAX_BATCH_SIZE, ORMBG_BATCH_WAIT_MS)
+            print(f"✅ ORMBG micro-batching enabled: up to {ORMBG_MAX_BATCH_SIZE} images, {ORMBG_BATCH_WAIT_MS}ms window")
+        return processor
     except ImportError as e:
         print(f"❌ Custom ORMBG import failed: {e}")
         return None
@@ -541,28 +738,611 @@ def try_import_custom_ormbg():
         print(f"❌ Custom ORMBG error: {e}")
         return None
 
+def load_ort_processor(processor, model_path):
+    """Export the ORMBG graph to ONNX if needed and open it on onnxruntime, or None on failure"""
+    try:
+        from ormbg.onnx_backend import ORTProcessor, export_if_stale, onnx_path_for
+
+        base_path = ORMBG_ONNX_PATH or f"{os.path.splitext(model_path)[0]}.onnx"
+        onnx_paths = {}
+        for size in ORMBG_INPUT_SIZES:
+            onnx_path = onnx_path_for(base_path, size)
+            export_start = time.time()
+            if export_if_stale(processor.net, model_path, onnx_path, size):
+                print(f"✅ ORMBG exported to ONNX at {onnx_path} in {time.time() - export_start:.2f} seconds")
+            onnx_paths[size] = onnx_path
+        ort_processor = ORTProcessor(onnx_paths, num_threads=ORMBG_ORT_THREADS, model_version=processor.model_version)
+        print(f"✅ ORMBG onnxruntime session ready ({ORMBG_ORT_THREADS or 'default'} threads)")
+        return ort_processor
+    except Exception as e:
+        print(f"⚠️ ORMBG onnxruntime backend unavailable, using torch: {e}")
+        return None
+
+def choose_faster_runtime(torch_processor, ort_processor):
+    """Measure both runtimes on the largest input size and keep the faster one"""
+    from ormbg.onnx_backend import measure_throughput
+
+    try:
+        torch_throughput = measure_throughput(torch_processor, ORMBG_INPUT_SIZES[-1])
+        ort_throughput = measure_throughput(ort_processor, ORMBG_INPUT_SIZES[-1])
+    except Exception as e:
+        print(f"⚠️ ORMBG runtime benchmark failed, using torch: {e}")
+        return torch_processor
+
+    print(f"🔍 ORMBG throughput: torch {torch_throughput:.3f} img/s, onnxruntime {ort_throughput:.3f} img/s")
+    if ort_throughput > torch_throughput:
+        print("✅ Using onnxruntime for ORMBG")
+        return ort_processor
+    print("✅ Using torch for ORMBG")
+    return torch_processor
+
+def quantize_ormbg(processor):
+    """Quantize the processor to INT8, keeping fp32 if quantization fails or loses too much quality"""
+    try:
+        from ormbg.samples import load_sample_images, synthetic_samples
+
+        quantize_start = time.time()
+        if ORMBG_CALIBRATION_DIR:
+            calibration_images = load_sample_images(ORMBG_CALIBRATION_DIR, limit=ORMBG_CALIBRATION_SAMPLES)
+        else:
+            calibration_images = synthetic_samples(ORMBG_CALIBRATION_SAMPLES, seed=0)
+        # The quality check always uses the bundled sample set
+        check_images = synthetic_samples(4, seed=1) if ORMBG_INT8_MIN_IOU > 0 else []
+
+        quality = processor.quantize(calibration_images, check_images, min_iou=ORMBG_INT8_MIN_IOU)
+        if processor.precision != "int8":
+            print(f"⚠️ INT8 ORMBG below quality threshold ({quality}), using fp32")
+        else:
+            print(f"✅ ORMBG quantized to INT8 in {time.time() - quantize_start:.2f} seconds, quality vs fp32: {quality}")
+    except Exception as e:
+        print(f"⚠️ ORMBG INT8 quantization failed, using fp32: {e}")
+
+class ModelRegistry:
+    """Process-wide registry that loads each backend once and keeps it resident.
+
+    Requests get the already-warm instance via use(). reload() builds a new
+    instance in a background thread and swaps it in, so in-flight requests keep
+    using the old one and traffic never stops. The old instance is closed once
+    its last user has finished.
+    """
+
+    def __init__(self, loaders: dict):
+        self._loaders = loaders
+        self._models = {}
+        self._status = {name: "not_loaded" for name in loaders}
+        self._errors = {}
+        self._loaded_at = {}
+        self._load_seconds = {}
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._initial_load_done = threading.Event()
+        # id(instance) -> requests using it, and replaced instances waiting
+        # for their last user before they are closed
+        self._users = {}
+        self._retired = {}
+
+    def load(self, name: str) -> bool:
+        """Build a backend and swap it in, keeping the previous instance on failure"""
+        with self._lock:
+            self._status[name] = "reloading" if name in self._models else "loading"
+
+        start_time = time.time()
+        try:
+            model = self._loaders[name]()
+            error = None if model is not None else "Backend unavailable"
+        except Exception as e:
+            model = None
+            error = str(e)
+        load_time = time.time() - start_time
+
+        previous = None
+        with self._lock:
+            if model is not None:
+                previous = self._models.get(name)
+                self._models[name] = model
+                self._status[name] = "ready"
+                self._loaded_at[name] = datetime.utcnow().isoformat()
+                self._load_seconds[name] = round(load_time, 2)
+                self._errors.pop(name, None)
+                if previous is not None and self._users.get(id(previous)):
+                    # Closed by the last use() still holding it
+                    self._retired[id(previous)] = previous
+                    previous = None
+            else:
+                # A failed reload keeps serving the previous instance
+                self._status[name] = "ready" if name in self._models else "failed"
+                self._errors[name] = error
+
+        # Nobody uses the replaced instance any more, release its threads
+        self._close(previous)
+
+        if model is not None:
+            print(f"✅ Backend '{name}' loaded in {load_time:.2f} seconds")
+        else:
+            print(f"❌ Backend '{name}' failed to load: {error}")
+        return model is not None
+
+    def load_all(self):
+        """Load every backend, used once at startup"""
+        for name in self._loaders:
+            self.load(name)
+        self._initial_load_done.set()
+        print(f"✅ Model registry ready: {self.status()['backends']}")
+
+    def start(self) -> threading.Thread:
+        """Load all backends in a background thread so /health answers during warmup"""
+        thread = threading.Thread(target=self.load_all, name="model-registry-load", daemon=True)
+        thread.start()
+        return thread
+
+    def reload(self, names: Optional[list] = None) -> bool:
+        """Reload backends in the background without blocking traffic.
+
+        Returns False if a reload is already in progress.
+        """
+        names = names or list(self._loaders)
+        unknown = [name for name in names if name not in self._loaders]
+        if unknown:
+            raise ValueError(f"Unknown backends: {', '.join(unknown)}")
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+
+        def _reload():
+            try:
+                for name in names:
+                    self.load(name)
+            finally:
+                self._reload_lock.release()
+
+        threading.Thread(target=_reload, name="model-registry-reload", daemon=True).start()
+        return True
+
+    def get(self, name: str):
+        """Return the warm backend instance, or None if it is not loaded"""
+        return self._models.get(name)
+
+    @contextlib.contextmanager
+    def use(self, name: str):
+        """Yield the warm backend instance (or None), kept open until the block exits"""
+        with self._lock:
+            model = self._models.get(name)
+            if model is not None:
+                self._users[id(model)] = self._users.get(id(model), 0) + 1
+        try:
+            yield model
+        finally:
+            if model is not None:
+                retired = None
+                with self._lock:
+                    self._users[id(model)] -= 1
+                    if not self._users[id(model)]:
+                        del self._users[id(model)]
+                        retired = self._retired.pop(id(model), None)
+                self._close(retired)
+
+    @staticmethod
+    def _close(model):
+        if model is not None and hasattr(model, "close"):
+            model.close()
+
+    def version(self, name: str) -> Optional[str]:
+        """Identifies the loaded weights, falling back to the load time"""
+        model = self._models.get(name)
+        return getattr(model, "model_version", None) or self._loaded_at.get(name)
+
+    def is_ready(self) -> bool:
+        """True once the initial load attempt has finished for every backend"""
+        return self._initial_load_done.is_set()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.is_ready(),
+                "reloading": self._reload_lock.locked(),
+                "backends": {
+                    name: {
+                        "status": self._status[name],
+                        "loaded_at": self._loaded_at.get(name),
+                        "load_seconds": self._load_seconds.get(name),
+                        "error": self._errors.get(name),
+                        "runtime": getattr(self._models.get(name), "runtime", None),
+                        "precision": getattr(self._models.get(name), "precision", None),
+                        "quality": getattr(self._models.get(name), "quality", None),
+                    }
+                    for name in self._loaders
+                },
+            }
+
+model_registry = ModelRegistry({
+    "custom_ormbg": try_import_custom_ormbg,
+    "rembg": try_import_ormbg,
+})
+
+@app.on_event("startup")
+async def load_models():
+    """Warm up all backends once per process"""
+    model_registry.start()
+
+# Inference executor configuration
+try:
+    INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "1"))  # Concurrent inference threads
+except ValueError:
+    print(f"⚠️ Invalid INFERENCE_WORKERS value: '{os.environ.get('INFERENCE_WORKERS')}', using default: 1")
+    INFERENCE_WORKERS = 1
+
+try:
+    INFERENCE_QUEUE_SIZE = int(os.environ.get("INFERENCE_QUEUE_SIZE", "8"))  # Requests allowed to wait
+except ValueError:
+    print(f"⚠️ Invalid INFERENCE_QUEUE_SIZE value: '{os.environ.get('INFERENCE_QUEUE_SIZE')}', using default: 8")
+    INFERENCE_QUEUE_SIZE = 8
+
+# ORMBG input resolutions. Images are letterboxed into one of these squares;
+# choose_input_size() picks one per request from the source size, the
+# client's hint and the current queue depth
+DEFAULT_INPUT_SIZES = [512, 768, 1024]
+try:
+    ORMBG_INPUT_SIZES = sorted({int(s) for s in os.environ.get("ORMBG_INPUT_SIZES", "512,768,1024").split(",") if s.strip()})
+    if not ORMBG_INPUT_SIZES or ORMBG_INPUT_SIZES[0] < 32:
+        raise ValueError
+except ValueError:
+    print(f"⚠️ Invalid ORMBG_INPUT_SIZES value: '{os.environ.get('ORMBG_INPUT_SIZES')}', using default: {DEFAULT_INPUT_SIZES}")
+    ORMBG_INPUT_SIZES = DEFAULT_INPUT_SIZES
+
+# Every this many queued requests, "auto" requests drop one input size (0 disables)
+try:
+    ORMBG_BUSY_QUEUE_DEPTH = int(os.environ.get("ORMBG_BUSY_QUEUE_DEPTH", str(max(1, INFERENCE_QUEUE_SIZE // 2))))
+except ValueError:
+    print(f"⚠️ Invalid ORMBG_BUSY_QUEUE_DEPTH value: '{os.environ.get('ORMBG_BUSY_QUEUE_DEPTH')}', using default: {max(1, INFERENCE_QUEUE_SIZE // 2)}")
+    ORMBG_BUSY_QUEUE_DEPTH = max(1, INFERENCE_QUEUE_SIZE // 2)
+
+# Memory cap for the float temporaries while a mask is scaled (or refined)
+# to full resolution; larger images are processed in more row bands
+try:
+    ORMBG_UPSAMPLE_MAX_MB = max(1, int(os.environ.get("ORMBG_UPSAMPLE_MAX_MB", "16")))
+except ValueError:
+    print(f"⚠️ Invalid ORMBG_UPSAMPLE_MAX_MB value: '{os.environ.get('ORMBG_UPSAMPLE_MAX_MB')}', using default: 16")
+    ORMBG_UPSAMPLE_MAX_MB = 16
+
+# Inference graph compilation at model load: conv-BN fusion, channels_last and
+# "trace" (TorchScript), "compile" (torch.compile) or "none" (plain eager)
+ORMBG_COMPILE = os.environ.get("ORMBG_COMPILE", "trace").lower()
+if ORMBG_COMPILE not in ("none", "trace", "compile"):
+    print(f"⚠️ Invalid ORMBG_COMPILE value: '{ORMBG_COMPILE}', using default: trace")
+    ORMBG_COMPILE = "trace"
+
+ORMBG_CHANNELS_LAST = os.environ.get("ORMBG_CHANNELS_LAST", "true").lower() == "true"
+
+# ORMBG runtime: "torch", "onnx" (onnxruntime on an exported ONNX graph) or
+# "auto" (benchmark both at startup and keep the faster one)
+ORMBG_BACKEND = os.environ.get("ORMBG_BACKEND", "torch").lower()
+if ORMBG_BACKEND not in ("torch", "onnx", "auto"):
+    print(f"⚠️ Invalid ORMBG_BACKEND value: '{ORMBG_BACKEND}', using default: torch")
+    ORMBG_BACKEND = "torch"
+
+# Defaults to the model path with an .onnx extension; re-exported when the .pth is newer
+ORMBG_ONNX_PATH = os.environ.get("ORMBG_ONNX_PATH")
+
+try:
+    ORMBG_ORT_THREADS = int(os.environ.get("ORMBG_ORT_THREADS", "0"))  # 0 lets onnxruntime decide
+except ValueError:
+    print(f"⚠️ Invalid ORMBG_ORT_THREADS value: '{os.environ.get('ORMBG_ORT_THREADS')}', using default: 0")
+    ORMBG_ORT_THREADS = 0
+
+# ORMBG weight precision: "fp32" or "int8" (static post-training quantization,
+# calibrated at load on ORMBG_CALIBRATION_DIR or the bundled synthetic samples)
+ORMBG_PRECISION = os.environ.get("ORMBG_PRECISION", "fp32").lower()
+if ORMBG_PRECISION not in ("fp32", "int8"):
+    print(f"⚠️ Invalid ORMBG_PRECISION value: '{ORMBG_PRECISION}', using default: fp32")
+    ORMBG_PRECISION = "fp32"
+
+ORMBG_CALIBRATION_DIR = os.environ.get("ORMBG_CALIBRATION_DIR")
+
+try:
+    ORMBG_CALIBRATION_SAMPLES = max(1, int(os.environ.get("ORMBG_CALIBRATION_SAMPLES", "8")))
+except ValueError:
+    print(f"⚠️ Invalid ORMBG_CALIBRATION_SAMPLES value: '{os.environ.get('ORMBG_CALIBRATION_SAMPLES')}', using default: 8")
+    ORMBG_CALIBRATION_SAMPLES = 8
+
+# Minimum mean mask IoU against fp32 for the INT8 model to be used (0 disables the check)
+try:
+    ORMBG_INT8_MIN_IOU = float(os.environ.get("ORMBG_INT8_MIN_IOU", "0.9"))
+except ValueError:
+    print(f"⚠️ Invalid ORMBG_INT8_MIN_IOU value: '{os.environ.get('ORMBG_INT8_MIN_IOU')}', using default: 0.9")
+    ORMBG_INT8_MIN_IOU = 0.9
+
+# Per-RSU-stage profiling: fraction of ORMBG forward passes timed stage by
+# stage (0 disables). Sampled passes run the eager (fused) model even when
+# ORMBG_COMPILE traces or compiles it; needs fp32 weights, the torch runtime
+# and no worker processes
+try:
+    ORMBG_PROFILE_SAMPLE_RATE = float(os.environ.get("ORMBG_PROFILE_SAMPLE_RATE", "0"))
+except ValueError:
+    print(f"⚠️ Invalid ORMBG_PROFILE_SAMPLE_RATE value: '{os.environ.get('ORMBG_PROFILE_SAMPLE_RATE')}', using default: 0")
+    ORMBG_PROFILE_SAMPLE_RATE = 0.0
+
+# Micro-batching gathers concurrent ORMBG requests into one forward pass.
+# Batches only form when several inference workers wait at the same time,
+# so INFERENCE_WORKERS should be at least ORMBG_MAX_BATCH_SIZE.
+try:
+    ORMBG_MAX_BATCH_SIZE = int(os.environ.get("ORMBG_MAX_BATCH_SIZE", "1"))  # 1 disables batching
+except ValueError:
+    print(f"⚠️ Invalid ORMBG_MAX_BATCH_SIZE value: '{os.environ.get('ORMBG_MAX_BATCH_SIZE')}', using default: 1")
+    ORMBG_MAX_BATCH_SIZE = 1
+
+try:
+    ORMBG_BATCH_WAIT_MS = float(os.environ.get("ORMBG_BATCH_WAIT_MS", "10"))  # Latency cap for gathering a batch
+except ValueError:
+    print(f"⚠️ Invalid ORMBG_BATCH_WAIT_MS value: '{os.environ.get('ORMBG_BATCH_WAIT_MS')}', using default: 10")
+    ORMBG_BATCH_WAIT_MS = 10.0
+
+# Worker processes share one copy of the ORMBG weights and split the CPU cores
+# between them. Each busy worker needs an inference thread feeding it.
+try:
+    ORMBG_WORKER_PROCESSES = int(os.environ.get("ORMBG_WORKER_PROCESSES", "0"))  # 0 runs inference in-process
+except ValueError:
+    print(f"⚠️ Invalid ORMBG_WORKER_PROCESSES value: '{os.environ.get('ORMBG_WORKER_PROCESSES')}', using default: 0")
+    ORMBG_WORKER_PROCESSES = 0
+
+if ORMBG_WORKER_PROCESSES > INFERENCE_WORKERS:
+    print(f"⚠️ ORMBG_WORKER_PROCESSES ({ORMBG_WORKER_PROCESSES}) exceeds INFERENCE_WORKERS ({INFERENCE_WORKERS}), some workers will stay idle")
+
+if ORMBG_MAX_BATCH_SIZE > INFERENCE_WORKERS:
+    print(f"⚠️ ORMBG_MAX_BATCH_SIZE ({ORMBG_MAX_BATCH_SIZE}) exceeds INFERENCE_WORKERS ({INFERENCE_WORKERS}), batches will not fill up")
+
+class QueueFullError(Exception):
+    """Raised when the inference queue has no free slot"""
+
+class InferenceExecutor:
+    """Runs blocking decode/inference/encode work off the event loop.
+
+    At most `workers` jobs run at once and at most `queue_size` more wait for a
+    worker; anything beyond that is rejected immediately with QueueFullError so
+    the caller can answer 503 instead of piling up requests.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._avg_job_seconds = 5.0  # Moving average used for Retry-After
+
+    async def run(self, func, *args):
+        """Run func(*args) on a worker and return (result, seconds spent queued)"""
+        with self._lock:
+            if self._queued + self._active >= self.workers + self.queue_size:
+                raise QueueFullError()
+            self._queued += 1
+
+        submitted_at = time.perf_counter()
+
+        def _job():
+            started_at = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+            try:
+                return func(*args), started_at - submitted_at
+            finally:
+                job_seconds = time.perf_counter() - started_at
+                with self._lock:
+                    self._active -= 1
+                    self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * job_seconds
+
+        return await asyncio.wrap_future(self._pool.submit(_job))
+
+    def queue_depth(self) -> int:
+        """Number of jobs waiting for a worker"""
+        return self._queued
+
+    def active_jobs(self) -> int:
+        """Number of jobs running on a worker"""
+        return self._active
+
+    def retry_after_seconds(self) -> int:
+        """Rough estimate of how long until a queue slot frees up"""
+        with self._lock:
+            backlog = self._queued + self._active
+            return max(1, int(self._avg_job_seconds * backlog / self.workers + 0.5))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queued": self._queued,
+                "active": self._active,
+                "avg_job_seconds": round(self._avg_job_seconds, 3),
+            }
+
+inference_executor = InferenceExecutor(INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE)
+print(f"✅ Inference executor configured: {INFERENCE_WORKERS} workers, queue size {INFERENCE_QUEUE_SIZE}")
+
+# Result cache configuration: masks keyed by upload hash + backend options
+try:
+    RESULT_CACHE_MAX_MB = int(os.environ.get("RESULT_CACHE_MAX_MB", "256"))  # 0 disables the memory tier
+except ValueError:
+    print(f"⚠️ Invalid RESULT_CACHE_MAX_MB value: '{os.environ.get('RESULT_CACHE_MAX_MB')}', using default: 256")
+    RESULT_CACHE_MAX_MB = 256
+
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR")  # Unset disables the disk tier
+
+try:
+    RESULT_CACHE_DISK_MAX_MB = int(os.environ.get("RESULT_CACHE_DISK_MAX_MB", "1024"))
+except ValueError:
+    print(f"⚠️ Invalid RESULT_CACHE_DISK_MAX_MB value: '{os.environ.get('RESULT_CACHE_DISK_MAX_MB')}', using default: 1024")
+    RESULT_CACHE_DISK_MAX_MB = 1024
+
+mask_cache = MaskCache(
+    RESULT_CACHE_MAX_MB * 1024 * 1024,
+    disk_dir=RESULT_CACHE_DIR,
+    max_disk_bytes=RESULT_CACHE_DISK_MAX_MB * 1024 * 1024
+)
+print(f"✅ Result cache configured: {RESULT_CACHE_MAX_MB}MB memory, disk: {RESULT_CACHE_DIR or 'disabled'}")
+
+# Prometheus metrics served by /metrics. Recording is per-thread and lock-free
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    "pixgone_stage_seconds", "Time spent in each stage of a background removal request", ("stage",)
+)
+backend_seconds = metrics.histogram(
+    "pixgone_backend_seconds", "Time to compute a mask on a cache miss, by backend", ("backend",)
+)
+requests_by_backend = metrics.counter(
+    "pixgone_requests_total", "Processed images by where the mask came from", ("backend",)
+)
+cache_lookups = metrics.counter(
+    "pixgone_mask_cache_lookups_total", "Mask cache lookups by result (memory, disk or miss)", ("result",)
+)
+bytes_in = metrics.counter("pixgone_upload_bytes_total", "Bytes of uploaded images")
+bytes_out = metrics.counter("pixgone_response_bytes_total", "Bytes of encoded results")
+rejections = metrics.counter(
+    "pixgone_rejections_total", "Rejected background removal requests by reason", ("reason",)
+)
+metrics.gauge("pixgone_inference_queue_depth", "Jobs waiting for an inference worker", inference_executor.queue_depth)
+metrics.gauge("pixgone_inference_active", "Jobs running on an inference worker", inference_executor.active_jobs)
+
+def observe_stage(stage: str, seconds: float):
+    """Record one stage timing; also the ORMBG processor's stage observer"""
+    stage_seconds.observe(seconds, stage)
+
+def rejection_reason(exc: HTTPException) -> str:
+    """Error code of a rejected request, HTTP_<status> when it has none"""
+    if isinstance(exc.detail, dict) and "code" in exc.detail:
+        return exc.detail["code"]
+    return f"HTTP_{exc.status_code}"
+
+@app.exception_handler(HTTPException)
+async def count_rejections(request: Request, exc: HTTPException):
+    if request.url.path == "/remove_background/":
+        rejections.inc(rejection_reason(exc))
+    return await http_exception_handler(request, exc)
+
+@app.exception_handler(RateLimitExceeded)
+async def count_rate_limited(request: Request, exc: RateLimitExceeded):
+    if request.url.path == "/remove_background/":
+        rejections.inc("RATE_LIMITED")
+    return _rate_limit_exceeded_handler(request, exc)
+
+# Simple fallback configuration (used when no network backend is available)
+try:
+    SIMPLE_BG_BRIGHTNESS = int(os.environ.get("SIMPLE_BG_BRIGHTNESS", "200"))  # 0 disables
+except ValueError:
+    print(f"⚠️ Invalid SIMPLE_BG_BRIGHTNESS value: '{os.environ.get('SIMPLE_BG_BRIGHTNESS')}', using default: 200")
+    SIMPLE_BG_BRIGHTNESS = 200
+
+try:
+    SIMPLE_BG_COLOR_DISTANCE = int(os.environ.get("SIMPLE_BG_COLOR_DISTANCE", "0"))  # 0 disables
+except ValueError:
+    print(f"⚠️ Invalid SIMPLE_BG_COLOR_DISTANCE value: '{os.environ.get('SIMPLE_BG_COLOR_DISTANCE')}', using default: 0")
+    SIMPLE_BG_COLOR_DISTANCE = 0
+
+SIMPLE_BG_FLOOD_FILL = os.environ.get("SIMPLE_BG_FLOOD_FILL", "false").lower() == "true"
+
+# Guided filter mask refinement: default strength (0 = off, 1 = fully filtered)
+# when the request has no "refine" field, and the filter radius in pixels of
+# the model-resolution mask
+try:
+    REFINE_STRENGTH = float(os.environ.get("REFINE_STRENGTH", "0"))
+    if not 0 <= REFINE_STRENGTH <= 1:
+        raise ValueError
+except ValueError:
+    print(f"⚠️ Invalid REFINE_STRENGTH value: '{os.environ.get('REFINE_STRENGTH')}', using default: 0")
+    REFINE_STRENGTH = 0.0
+
+try:
+    REFINE_RADIUS = max(1, int(os.environ.get("REFINE_RADIUS", "8")))
+except ValueError:
+    print(f"⚠️ Invalid REFINE_RADIUS value: '{os.environ.get('REFINE_RADIUS')}', using default: 8")
+    REFINE_RADIUS = 8
+
+# Fast path: images on a near-uniform background (product shots) are colour
+# keyed instead of running the network. Only taken when at least
+# FASTPATH_MIN_BORDER_FRACTION of the border is within FASTPATH_TOLERANCE of
+# the border colour and the keyed subject covers a plausible share of the image
+FASTPATH_ENABLED = os.environ.get("FASTPATH_ENABLED", "true").lower() == "true"
+
+try:
+    FASTPATH_TOLERANCE = int(os.environ.get("FASTPATH_TOLERANCE", "12"))
+except ValueError:
+    print(f"⚠️ Invalid FASTPATH_TOLERANCE value: '{os.environ.get('FASTPATH_TOLERANCE')}', using default: 12")
+    FASTPATH_TOLERANCE = 12
+
+try:
+    FASTPATH_MIN_BORDER_FRACTION = float(os.environ.get("FASTPATH_MIN_BORDER_FRACTION", "0.98"))
+except ValueError:
+    print(f"⚠️ Invalid FASTPATH_MIN_BORDER_FRACTION value: '{os.environ.get('FASTPATH_MIN_BORDER_FRACTION')}', using default: 0.98")
+    FASTPATH_MIN_BORDER_FRACTION = 0.98
+
+FASTPATH_SOFTNESS = 24
+FASTPATH_FOREGROUND_RANGE = (0.005, 0.95)
+
+class RoutingStats:
+    """Counts which path each decoded image took and why"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {"network": 0, "color_key": 0}
+        self._reasons = defaultdict(int)
+
+    def record(self, route: str, reason: str):
+        with self._lock:
+            self._routes[route] += 1
+            self._reasons[reason] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(self._routes.values())
+            return {
+                "enabled": FASTPATH_ENABLED,
+                "routes": dict(self._routes),
+                "share": {route: round(count / total, 4) if total else 0.0 for route, count in self._routes.items()},
+                "reasons": dict(self._reasons),
+            }
+
+routing_stats = RoutingStats()
+
+def fast_path_mask(image):
+    """Colour-key mask for a plain-background image, or None to use the network.
+
+    The fast path is only a shortcut: any error in it falls back to the network.
+    """
+    try:
+        rgb = np.asarray(image)
+        color, border_fraction = classify_plain_background(rgb, FASTPATH_TOLERANCE)
+        if border_fraction < FASTPATH_MIN_BORDER_FRACTION:
+            routing_stats.record("network", "border_not_uniform")
+            return None
+        alpha = color_key_mask(rgb, color, FASTPATH_TOLERANCE, FASTPATH_SOFTNESS)
+    except Exception as e:
+        print(f"⚠️ Fast path failed, using the network: {e}")
+        routing_stats.record("network", "fast_path_error")
+        return None
+
+    foreground = np.count_nonzero(alpha >= 128) / alpha.size
+    if not FASTPATH_FOREGROUND_RANGE[0] <= foreground <= FASTPATH_FOREGROUND_RANGE[1]:
+        routing_stats.record("network", "foreground_out_of_range")
+        return None
+
+    routing_stats.record("color_key", "plain_background")
+    return Image.fromarray(alpha, mode="L")
+
+def simple_background_mask_for(image):
+    """Alpha mask from the vectorized threshold method with the configured criteria"""
+    return simple_background_mask(
+        image,
+        brightness_threshold=SIMPLE_BG_BRIGHTNESS,
+        color_distance=SIMPLE_BG_COLOR_DISTANCE,
+        flood_fill=SIMPLE_BG_FLOOD_FILL
+    )
+
 def simple_background_removal(image):
     """Simple background removal - removes white/bright backgrounds"""
     try:
-        # Convert to RGBA
         rgba = image.convert('RGBA')
-        data = rgba.load()
-        
-        # Get image dimensions
-        width, height = rgba.size
-        
-        # Simple threshold-based background removal
-        for y in range(height):
-            for x in range(width):
-                r, g, b, a = data[x, y]
-                
-                # If pixel is bright (likely background), make it transparent
-                brightness = (r + g + b) / 3
-                if brightness > 200:  # Adjust threshold as needed
-                    data[x, y] = (r, g, b, 0)  # Make transparent
-                else:
-                    data[x, y] = (r, g, b, 255)  # Keep opaque
-        
+        rgba.putalpha(simple_background_mask_for(image))
         return rgba
         
     except Exception as e:
@@ -583,16 +1363,406 @@ async def options_handler(request: Request):
         }
     )
 
+INPUT_SIZE_HINTS = ("auto", "fast", "quality")
+
+def choose_input_size(width: int, height: int, hint: str = "auto") -> int:
+    """Pick the ORMBG input resolution for a width x height image.
+
+    "fast" and "quality" take the smallest and largest configured size.
+    "auto" takes the smallest size that does not downscale the image (a
+    thumbnail gains nothing from a bigger input) and steps down one size per
+    ORMBG_BUSY_QUEUE_DEPTH requests waiting in the inference queue.
+    """
+    if hint == "fast":
+        return ORMBG_INPUT_SIZES[0]
+    if hint == "quality":
+        return ORMBG_INPUT_SIZES[-1]
+
+    longest = max(width, height)
+    index = next((i for i, size in enumerate(ORMBG_INPUT_SIZES) if size >= longest), len(ORMBG_INPUT_SIZES) - 1)
+    if ORMBG_BUSY_QUEUE_DEPTH > 0:
+        index -= inference_executor.queue_depth() // ORMBG_BUSY_QUEUE_DEPTH
+    return ORMBG_INPUT_SIZES[max(0, index)]
+
+def remove_background_mask(image, input_size=1024, output_size=None):
+    """Run the backend chain and return (alpha mask, backend name).
+
+    `image` may be a reduced decode; the mask is always output_size
+    (default: the image size).
+    """
+    start_time = time.time()
+    output_size = output_size or image.size
+    
+    # Try custom ORMBG first (original implementation). A reload waits for
+    # this call before closing the instance it uses
+    with model_registry.use("custom_ormbg") as custom_processor:
+        if custom_processor:
+            try:
+                print("Using custom ORMBG for background removal")
+                mask = custom_processor.predict_mask(image, input_size, output_size)
+                process_time = time.time() - start_time
+                print(f"Custom ORMBG completed in {process_time:.2f} seconds")
+                return mask, "custom_ormbg"
+            except Exception as e:
+                print(f"Custom ORMBG failed: {e}, trying standard ormbg")
+    
+    # Fall back to standard ormbg
+    remove_func = model_registry.get("rembg")
+    if remove_func:
+        try:
+            print("Using standard ormbg for background removal")
+            mask = remove_func(image)
+            if mask.size != output_size:
+                mask = mask.resize(output_size, Image.BILINEAR)
+            process_time = time.time() - start_time
+            print(f"Standard ormbg completed in {process_time:.2f} seconds")
+            return mask, "rembg"
+        except Exception as e:
+            print(f"Standard ormbg failed: {e}, using simple method")
+    
+    # Use simple background removal
+    print("Using simple background removal algorithm")
+    try:
+        mask = simple_background_mask_for(image)
+        if mask.size != output_size:
+            mask = mask.resize(output_size, Image.BILINEAR)
+    except Exception as e:
+        print(f"Background removal failed: {e}")
+        mask = Image.new("L", output_size, 255)
+    process_time = time.time() - start_time
+    print(f"Simple method completed in {process_time:.2f} seconds")
+    return mask, "simple"
+
+def mask_cache_options(input_size: int, refine: float) -> dict:
+    """Backend and options that determine the mask, part of the cache key"""
+    backend = "custom_ormbg" if model_registry.get("custom_ormbg") else "rembg"
+    options = {
+        "backend": backend,
+        "model_version": model_registry.version(backend),
+    }
+    if FASTPATH_ENABLED:
+        options["fastpath"] = [FASTPATH_TOLERANCE, FASTPATH_MIN_BORDER_FRACTION]
+    if refine > 0:
+        options["refine"] = refine
+        options["refine_radius"] = REFINE_RADIUS
+    # rembg always runs at its own fixed resolution
+    if backend == "custom_ormbg":
+        options["input_size"] = input_size
+    return options
+
+# Largest decoded image accepted, checked from the header before decoding
+try:
+    MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", "50000000"))
+except ValueError:
+    print(f"⚠️ Invalid MAX_IMAGE_PIXELS value: '{os.environ.get('MAX_IMAGE_PIXELS')}', using default: 50000000")
+    MAX_IMAGE_PIXELS = 50_000_000
+
+# Output modes: full RGBA cut-out, or only the alpha mask so the client can
+# composite over the original it already holds. WebP has no grayscale mode:
+# output=mask encoded as WebP comes back as 3-channel RGB (R = G = B = alpha)
+OUTPUT_MODES = ("rgba", "mask", "mask_raw")
+
+# Output encoders, selectable per request via the "format" form field or Accept
+try:
+    PNG_COMPRESS_LEVEL = int(os.environ.get("PNG_COMPRESS_LEVEL", "6"))  # 0 (fastest) - 9 (smallest)
+except ValueError:
+    print(f"⚠️ Invalid PNG_COMPRESS_LEVEL value: '{os.environ.get('PNG_COMPRESS_LEVEL')}', using default: 6")
+    PNG_COMPRESS_LEVEL = 6
+
+try:
+    WEBP_QUALITY = int(os.environ.get("WEBP_QUALITY", "85"))  # Quality for lossy WebP/AVIF
+except ValueError:
+    print(f"⚠️ Invalid WEBP_QUALITY value: '{os.environ.get('WEBP_QUALITY')}', using default: 85")
+    WEBP_QUALITY = 85
+
+try:
+    WEBP_METHOD = int(os.environ.get("WEBP_METHOD", "4"))  # 0 (fastest) - 6 (smallest)
+except ValueError:
+    print(f"⚠️ Invalid WEBP_METHOD value: '{os.environ.get('WEBP_METHOD')}', using default: 4")
+    WEBP_METHOD = 4
+
+# Lossless WebP effort: Pillow's "quality" (0-100) and method (0-6) both
+# trade encode time for size. The defaults encode faster than PNG level 6
+# and still come out smaller; 100/6 can be 10x slower than PNG
+try:
+    WEBP_LOSSLESS_EFFORT = int(os.environ.get("WEBP_LOSSLESS_EFFORT", "25"))
+except ValueError:
+    print(f"⚠️ Invalid WEBP_LOSSLESS_EFFORT value: '{os.environ.get('WEBP_LOSSLESS_EFFORT')}', using default: 25")
+    WEBP_LOSSLESS_EFFORT = 25
+
+try:
+    WEBP_LOSSLESS_METHOD = int(os.environ.get("WEBP_LOSSLESS_METHOD", "0"))
+except ValueError:
+    print(f"⚠️ Invalid WEBP_LOSSLESS_METHOD value: '{os.environ.get('WEBP_LOSSLESS_METHOD')}', using default: 0")
+    WEBP_LOSSLESS_METHOD = 0
+
+PNG_OPTIMIZE = os.environ.get("PNG_OPTIMIZE", "false").lower() == "true"
+
+try:
+    import pillow_avif  # noqa: F401  Registers the AVIF encoder with Pillow
+    AVIF_AVAILABLE = True
+except ImportError:
+    AVIF_AVAILABLE = False
+
+OUTPUT_FORMATS = {
+    "png": "image/png",
+    "webp": "image/webp",  # Lossless
+    "webp_lossy": "image/webp",
+    "avif": "image/avif",
+}
+
+encode_stats = defaultdict(lambda: {"count": 0, "total_seconds": 0.0, "total_bytes": 0})
+encode_stats_lock = threading.Lock()
+
+def get_encode_stats() -> dict:
+    """Per-format encode counts, average time and average size"""
+    with encode_stats_lock:
+        return {
+            fmt: {
+                "count": stats["count"],
+                "avg_ms": round(stats["total_seconds"] * 1000 / stats["count"], 2),
+                "avg_bytes": stats["total_bytes"] // stats["count"],
+            }
+            for fmt, stats in encode_stats.items() if stats["count"]
+        }
+
+def accept_qualities(accept: str) -> dict:
+    """Media type -> q-value from an Accept header (q defaults to 1)"""
+    qualities = {}
+    for part in accept.lower().split(","):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        if not media_type:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[media_type] = max(q, qualities.get(media_type, 0.0))
+    return qualities
+
+def negotiate_output_format(requested: Optional[str], accept: str) -> Optional[str]:
+    """Pick the output format from the form field, then the Accept header.
+
+    Only types the Accept header names explicitly with q > 0 are chosen over
+    PNG, and not when image/png has a higher q. Returns None if an
+    explicitly requested format is not supported.
+    """
+    if requested:
+        requested = requested.lower()
+        if requested not in OUTPUT_FORMATS or (requested == "avif" and not AVIF_AVAILABLE):
+            return None
+        return requested
+    
+    qualities = accept_qualities(accept)
+    # Highest q wins, AVIF before WebP on a tie (max keeps the first)
+    candidates = (["avif"] if AVIF_AVAILABLE else []) + ["webp"]
+    best = max(candidates, key=lambda fmt: qualities.get(OUTPUT_FORMATS[fmt], 0.0))
+    q = qualities.get(OUTPUT_FORMATS[best], 0.0)
+    if q > 0 and q >= qualities.get("image/png", 0.0):
+        return best
+    return "png"
+
+def encode_image(image, output_format: str, compress_level: Optional[int] = None) -> bytes:
+    """Encode the result and record per-format encode timing"""
+    start_time = time.perf_counter()
+    
+    with io.BytesIO() as output:
+        if output_format == "webp":
+            image.save(output, format="WEBP", lossless=True, quality=WEBP_LOSSLESS_EFFORT,
+                       method=WEBP_LOSSLESS_METHOD)
+        elif output_format == "webp_lossy":
+            image.save(output, format="WEBP", quality=WEBP_QUALITY, method=WEBP_METHOD)
+        elif output_format == "avif":
+            image.save(output, format="AVIF", quality=WEBP_QUALITY)
+        else:
+            level = PNG_COMPRESS_LEVEL if compress_level is None else compress_level
+            image.save(output, format="PNG", compress_level=level, optimize=PNG_OPTIMIZE)
+        content = output.getvalue()
+    
+    encode_time = time.perf_counter() - start_time
+    with encode_stats_lock:
+        stats = encode_stats[output_format]
+        stats["count"] += 1
+        stats["total_seconds"] += encode_time
+        stats["total_bytes"] += len(content)
+    print(f"Encoded {output_format} ({len(content)} bytes) in {encode_time * 1000:.1f}ms")
+    return content
+
+def process_upload(image_data: bytes, client_ip: str, options: dict) -> tuple:
+    """Remove the background on a mask cache miss and encode the result.
+
+    Runs on the inference executor, never on the event loop. The cache key
+    and the memory tier are checked before queueing (see remove_background);
+    this checks the disk tier and runs the backends. Returns the encoded
+    content, its media type and extra response headers.
+    """
+    # Dimensions come from the header probe; pixels are decoded on a cache miss
+    source_size = options["source_size"]
+    input_size = options["input_size"]
+    refine = options.get("refine", 0.0)
+    cache_key = options["cache_key"]
+    full_image = None
+    mask, cache_tier = mask_cache.get(cache_key)
+    
+    if mask is not None:
+        print(f"Mask cache hit ({cache_tier}) for IP: {client_ip}")
+        cache_lookups.inc(cache_tier)
+        requests_by_backend.inc("cache")
+        headers = {"X-Cache": "HIT", "X-Cache-Tier": cache_tier, "X-Backend": "cache"}
+    else:
+        cache_lookups.inc("miss")
+        # Decoded at about the model resolution, the mask comes back at full
+        # size. Outputs that need the full image too get it from the same
+        # decode unless a reduced JPEG decode is cheaper
+        decode_start = time.perf_counter()
+        need_full = options["output"] == "rgba" or refine > 0
+        model_image, full_image = decode_upload(image_data, input_size, need_full)
+        observe_stage("decode", time.perf_counter() - decode_start)
+        print(f"Processing image: {source_size} (decoded at {model_image.size}) for IP: {client_ip}")
+        mask_start = time.perf_counter()
+        mask = fast_path_mask(model_image) if FASTPATH_ENABLED else None
+        if mask is not None:
+            backend = "color_key"
+        elif refine > 0:
+            mask, backend = remove_background_mask(model_image, input_size)
+        else:
+            mask, backend = remove_background_mask(model_image, input_size, source_size)
+        backend_seconds.observe(time.perf_counter() - mask_start, backend)
+        requests_by_backend.inc(backend)
+        
+        del model_image
+        if refine > 0:
+            # The coefficients are fitted at low resolution and applied to the
+            # full-resolution decode. Refinement is opt-in, so mask-only
+            # outputs pay this decode too; rgba reuses it for compositing
+            if full_image is None:
+                decode_start = time.perf_counter()
+                full_image = decode_full(image_data)
+                observe_stage("decode", time.perf_counter() - decode_start)
+            refine_start = time.perf_counter()
+            mask = refine_mask(full_image, mask, refine, radius=REFINE_RADIUS,
+                               max_bytes=ORMBG_UPSAMPLE_MAX_MB * 1024 * 1024)
+            observe_stage("refine", time.perf_counter() - refine_start)
+        if mask.size != source_size:
+            mask = mask.resize(source_size, Image.BILINEAR)
+        # Only keep masks from the backend the key was built for (the colour
+        # key is covered by the key's fastpath options). A fallback result
+        # would otherwise be served as a hit for the primary backend
+        if backend in (options["cache_backend"], "color_key"):
+            mask_cache.put(cache_key, mask)
+        headers = {"X-Cache": "MISS", "X-Backend": backend}
+        if backend == "custom_ormbg":
+            headers["X-Input-Size"] = str(input_size)
+    
+    return render_output(image_data, mask, options, headers, full_image)
+
+def render_output(image_data: bytes, mask, options: dict, headers: dict,
+                  image: Optional[Image.Image] = None) -> tuple:
+    """Composite and encode the requested output for a full-resolution mask.
+    
+    `image` is the full-resolution decode when the caller already has one.
+    """
+    output_mode = options["output"]
+    output_format = options["format"]
+    
+    if output_mode == "mask_raw":
+        # Raw 8-bit alpha, one byte per pixel, row-major
+        headers.update({"X-Mask-Width": str(mask.width), "X-Mask-Height": str(mask.height)})
+        return mask.tobytes(), "application/octet-stream", headers
+    
+    if output_mode == "mask":
+        result = mask
+    else:
+        # The only full-resolution decode (unless process_upload already made
+        # one), needed to composite the cut-out
+        if image is None:
+            decode_start = time.perf_counter()
+            image = decode_full(image_data)
+            observe_stage("decode", time.perf_counter() - decode_start)
+        composite_start = time.perf_counter()
+        result = Image.new("RGBA", image.size, (0, 0, 0, 0))
+        result.paste(image, mask=mask)
+        observe_stage("composite", time.perf_counter() - composite_start)
+    
+    encode_start = time.perf_counter()
+    content = encode_image(result, output_format, options.get("compress_level"))
+    encode_seconds = time.perf_counter() - encode_start
+    observe_stage("encode", encode_seconds)
+    headers["X-Encode-Ms"] = f"{encode_seconds * 1000:.1f}"
+    
+    return content, OUTPUT_FORMATS[output_format], headers
+
 @app.post("/remove_background/")
+@rate_limit_in_thread
 @limiter.limit(RATE_LIMIT)
-async def remove_background(request: Request, file: UploadFile = File(...)):
+async def remove_background(
+    request: Request,
+    file: UploadFile = File(...),
+    output: str = Form("rgba"),
+    output_format: Optional[str] = Form(None, alias="format"),
+    compress_level: Optional[int] = Form(None),
+    hint: str = Form("auto"),
+    refine: Optional[float] = Form(None)
+):
     print("🔄 Processing background removal request")
     
+    if output not in OUTPUT_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "Invalid output mode",
+                "message": f"output must be one of: {', '.join(OUTPUT_MODES)}",
+                "code": "INVALID_OUTPUT_MODE"
+            }
+        )
+    
+    negotiated_format = negotiate_output_format(output_format, request.headers.get("Accept", ""))
+    if negotiated_format is None:
+        supported = [f for f in OUTPUT_FORMATS if f != "avif" or AVIF_AVAILABLE]
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "Unsupported output format",
+                "message": f"format must be one of: {', '.join(supported)}",
+                "code": "INVALID_OUTPUT_FORMAT"
+            }
+        )
+    
+    if compress_level is not None and not 0 <= compress_level <= 9:
+        raise HTTPException(status_code=400, detail="compress_level must be between 0 and 9")
+    
+    if hint not in INPUT_SIZE_HINTS:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "Invalid hint",
+                "message": f"hint must be one of: {', '.join(INPUT_SIZE_HINTS)}",
+                "code": "INVALID_HINT"
+            }
+        )
+    
+    if refine is None:
+        refine = REFINE_STRENGTH
+    if not 0 <= refine <= 1:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "Invalid refine strength",
+                "message": "refine must be between 0 and 1",
+                "code": "INVALID_REFINE"
+            }
+        )
+    
     # Get client IP and check for abuse
     client_ip = get_client_ip(request)
     
-    # Check if IP is blocked
-    if is_ip_blocked(client_ip):
+    # Check if IP is blocked and track daily request
+    ip_blocked, limit_exceeded = await counter_store_call(track_daily_request, client_ip)
+    if ip_blocked:
         raise HTTPException(
             status_code=429, 
             detail={
@@ -602,8 +1772,7 @@ async def remove_background(request: Request, file: UploadFile = File(...)):
             }
         )
     
-    # Track daily request
-    if track_daily_request(client_ip):
+    if limit_exceeded:
         raise HTTPException(
             status_code=429,
             detail={
@@ -615,24 +1784,38 @@ async def remove_background(request: Request, file: UploadFile = File(...)):
         )
     
     # Check if app is enabled based on costs vs donations
-    app_status = is_app_enabled()
-    if not app_status["enabled"]:
+    if not app_gate.enabled:
         raise HTTPException(
             status_code=503,
             detail={
                 "error": "Service temporarily unavailable",
                 "message": "Service is currently disabled due to cost limits. Please donate to help keep it running!",
                 "code": "SERVICE_DISABLED",
-                "app_status": app_status
+                "app_status": app_gate.status
             }
         )
     
+    # Models are loaded once in the background at startup
+    if not model_registry.is_ready():
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "error": "Service warming up",
+                "message": "Background removal models are still loading. Please try again in a few seconds.",
+                "code": "MODELS_LOADING"
+            },
+            headers={"Retry-After": "10"}
+        )
+    
     try:
         # Validate file
         if not file.content_type or not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
         
+        read_start = time.perf_counter()
         image_data = await file.read()
+        observe_stage("upload_read", time.perf_counter() - read_start)
+        bytes_in.inc(amount=len(image_data))
         if len(image_data) == 0:
             raise HTTPException(status_code=400, detail="Empty file")
         
@@ -643,69 +1826,81 @@ async def remove_background(request: Request, file: UploadFile = File(...)):
                 detail={
                     "error": "File too large",
                     "message": "Image file size must be less than 10MB",
-                    "max_size_mb": 10
+                    "max_size_mb": 10,
+                    "code": "FILE_TOO_LARGE"
                 }
             )
         
-        image = Image.open(io.BytesIO(image_data)).convert('RGB')
-        print(f"Processing image: {image.size} for IP: {client_ip}")
+        # Header-only probe: reject pixel bombs before anything is decoded
+        try:
+            _, width, height = probe_image(image_data, MAX_IMAGE_PIXELS)
+        except ImageTooLarge:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "Image too large",
+                    "message": f"Image must have at most {MAX_IMAGE_PIXELS // 1_000_000} megapixels",
+                    "max_pixels": MAX_IMAGE_PIXELS,
+                    "code": "IMAGE_TOO_LARGE"
+                }
+            )
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "Invalid image",
+                    "message": "The uploaded file could not be read as an image",
+                    "code": "INVALID_IMAGE"
+                }
+            )
         
-        start_time = time.time()
+        # The cache key and the memory tier are checked before queueing: a
+        # hit needs no inference slot and is never rejected as QUEUE_FULL
+        input_size = choose_input_size(width, height, hint)
+        key_options = mask_cache_options(input_size, refine)
+        cache_key = await asyncio.to_thread(make_cache_key, image_data, key_options)
+        options = {
+            "output": output, "format": negotiated_format, "compress_level": compress_level, "refine": refine,
+            "source_size": (width, height), "input_size": input_size,
+            "cache_key": cache_key, "cache_backend": key_options["backend"]
+        }
         
-        # Try custom ORMBG first (original implementation)
-        custom_remove_func = try_import_custom_ormbg()
-        if custom_remove_func:
-            try:
-                print("Using custom ORMBG for background removal")
-                no_bg_image = custom_remove_func(image)
-                process_time = time.time() - start_time
-                print(f"Custom ORMBG completed in {process_time:.2f} seconds")
-            except Exception as e:
-                print(f"Custom ORMBG failed: {e}, trying standard ormbg")
-                # Fall back to standard ormbg
-                remove_func = try_import_ormbg()
-                if remove_func:
-                    try:
-                        no_bg_image = remove_func(image)
-                        process_time = time.time() - start_time
-                        print(f"Standard ormbg completed in {process_time:.2f} seconds")
-                    except Exception as e2:
-                        print(f"Standard ormbg failed: {e2}, using simple method")
-                        no_bg_image = simple_background_removal(image)
-                        process_time = time.time() - start_time
-                        print(f"Simple method completed in {process_time:.2f} seconds")
-                else:
-                    no_bg_image = simple_background_removal(image)
-                    process_time = time.time() - start_time
-                    print(f"Simple method completed in {process_time:.2f} seconds")
-        else:
-            # Try standard ormbg
-            remove_func = try_import_ormbg()
-            if remove_func:
-                try:
-                    print("Using standard ormbg for background removal")
-                    no_bg_image = remove_func(image)
-                    process_time = time.time() - start_time
-                    print(f"Standard ormbg completed in {process_time:.2f} seconds")
-                except Exception as e:
-                    print(f"Standard ormbg failed: {e}, using simple method")
-                    no_bg_image = simple_background_removal(image)
-                    process_time = time.time() - start_time
-                    print(f"Simple method completed in {process_time:.2f} seconds")
+        cached_mask = mask_cache.get_memory(cache_key)
+        try:
+            if cached_mask is not None:
+                print(f"Mask cache hit (memory) for IP: {client_ip}")
+                cache_lookups.inc("memory")
+                requests_by_backend.inc("cache")
+                headers = {"X-Cache": "HIT", "X-Cache-Tier": "memory", "X-Backend": "cache"}
+                content, media_type, headers = await asyncio.to_thread(
+                    render_output, image_data, cached_mask, options, headers
+                )
+                queue_wait = 0.0
             else:
-                # Use simple background removal
-                print("Using simple background removal algorithm")
-                no_bg_image = simple_background_removal(image)
-                process_time = time.time() - start_time
-                print(f"Background removal completed in {process_time:.2f} seconds")
-        
-        # Convert to PNG
-        with io.BytesIO() as output:
-            no_bg_image.save(output, format="PNG")
-            content = output.getvalue()
+                (content, media_type, headers), queue_wait = await inference_executor.run(
+                    process_upload, image_data, client_ip, options
+                )
+        except QueueFullError:
+            retry_after = inference_executor.retry_after_seconds()
+            print(f"⚠️ Inference queue full, rejecting request from IP: {client_ip}")
+            raise HTTPException(
+                status_code=503,
+                detail={
+                    "error": "Server busy",
+                    "message": "Too many images are being processed right now. Please try again shortly.",
+                    "code": "QUEUE_FULL",
+                    "retry_after": retry_after
+                },
+                headers={"Retry-After": str(retry_after)}
+            )
 
         print(f"✅ Processing completed successfully for IP: {client_ip}")
-        return Response(content=content, media_type="image/png")
+        bytes_out.inc(amount=len(content))
+        return Response(
+            content=content,
+            media_type=media_type,
+            headers={**headers, "X-Queue-Wait-Ms": f"{queue_wait * 1000:.1f}"}
+        )
 
     except HTTPException:
         raise
@@ -721,13 +1916,38 @@ async def root():
 @app.get("/health")
 async def health():
     print("Health endpoint called")
+    batcher = getattr(model_registry.get("custom_ormbg"), "batcher", None)
     return {
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
         "rate_limiting": True,
-        "cost_monitoring": bool(RAILWAY_API_TOKEN and RAILWAY_PROJECT_ID)
+        "cost_monitoring": bool(RAILWAY_API_TOKEN and RAILWAY_PROJECT_ID),
+        "models_ready": model_registry.is_ready(),
+        "inference": inference_executor.stats(),
+        "batching": batcher.stats() if batcher is not None else None,
+        "result_cache": mask_cache.stats(),
+        "encoders": get_encode_stats(),
+        "routing": routing_stats.stats()
     }
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics.render(), media_type=metrics.content_type)
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until every backend has finished its initial load"""
+    status = model_registry.status()
+    if not status["ready"]:
+        return Response(
+            content=json.dumps(status),
+            status_code=503,
+            media_type="application/json",
+            headers={"Retry-After": "10"}
+        )
+    return status
+
 @app.get("/admin/stats")
 async def get_rate_limit_stats(request: Request):
     """Admin endpoint to view rate limiting statistics"""
@@ -736,22 +1956,22 @@ async def get_rate_limit_stats(request: Request):
     if admin_key != os.environ.get("ADMIN_KEY", "pixgone-admin-2024"):
         raise HTTPException(status_code=403, detail="Unauthorized")
     
-    with storage_lock:
-        today = datetime.now().strftime("%Y-%m-%d")
-        today_stats = {k: v for k, v in daily_requests.items() if k.endswith(f":{today}")}
-        
-        return {
-            "today_requests": len(today_stats),
-            "total_requests_today": sum(today_stats.values()),
-            "blocked_ips_count": len(blocked_ips),
-            "blocked_ips": list(blocked_ips),
-            "top_ips_today": sorted(today_stats.items(), key=lambda x: x[1], reverse=True)[:10],
-            "limits": {
-                "daily_limit": DAILY_LIMIT,
-                "rate_limit": RATE_LIMIT,
-                "abuse_threshold": ABUSE_THRESHOLD
-            }
+    today_stats = await counter_store_call(counter_store.day_stats, current_day(), 10)
+    blocked_ips = await counter_store_call(counter_store.blocked_ips)
+    
+    return {
+        "today_requests": today_stats["ips"],
+        "total_requests_today": today_stats["total"],
+        "blocked_ips_count": len(blocked_ips),
+        "blocked_ips": blocked_ips,
+        "top_ips_today": today_stats["top"],
+        "counter_store": counter_store.name,
+        "limits": {
+            "daily_limit": DAILY_LIMIT,
+            "rate_limit": RATE_LIMIT,
+            "abuse_threshold": ABUSE_THRESHOLD
         }
+    }
 
 @app.post("/admin/unblock/{ip}")
 async def unblock_ip(ip: str, request: Request):
@@ -760,40 +1980,60 @@ async def unblock_ip(ip: str, request: Request):
     if admin_key != os.environ.get("ADMIN_KEY", "pixgone-admin-2024"):
         raise HTTPException(status_code=403, detail="Unauthorized")
     
-    with storage_lock:
-        if ip in blocked_ips:
-            blocked_ips.remove(ip)
-            print(f"✅ IP {ip} unblocked by admin")
-            return {"message": f"IP {ip} unblocked successfully"}
-        else:
-            return {"message": f"IP {ip} was not blocked"}
+    if await counter_store_call(counter_store.unblock, ip):
+        print(f"✅ IP {ip} unblocked by admin")
+        return {"message": f"IP {ip} unblocked successfully"}
+    else:
+        return {"message": f"IP {ip} was not blocked"}
+
+@app.post("/admin/reload-models")
+async def reload_models(request: Request, backend: Optional[str] = None):
+    """Admin endpoint to reload backends in the background without stopping traffic"""
+    admin_key = request.headers.get("X-Admin-Key")
+    if admin_key != os.environ.get("ADMIN_KEY", "pixgone-admin-2024"):
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    
+    try:
+        started = model_registry.reload([backend] if backend else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not started:
+        raise HTTPException(status_code=409, detail="A model reload is already in progress")
+    
+    print(f"🔄 Model reload started by admin: {backend or 'all backends'}")
+    return {"message": "Model reload started", "status": model_registry.status()}
+
+@app.get("/admin/ormbg-profile")
+async def get_ormbg_profile(request: Request, reset: bool = False):
+    """Admin endpoint with per-stage ORMBG timing percentiles (ORMBG_PROFILE_SAMPLE_RATE)"""
+    admin_key = request.headers.get("X-Admin-Key")
+    if admin_key != os.environ.get("ADMIN_KEY", "pixgone-admin-2024"):
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    
+    processor = model_registry.get("custom_ormbg")
+    profiler = getattr(processor, "profiler", None)
+    if profiler is None:
+        raise HTTPException(
+            status_code=404,
+            detail="ORMBG stage profiling is not enabled (set ORMBG_PROFILE_SAMPLE_RATE, fp32 torch runtime without worker processes)"
+        )
+    
+    profile = profiler.stats()
+    if reset:
+        profiler.reset()
+    return profile
 
 @app.get("/rate-limit-info")
 async def get_rate_limit_info(request: Request):
     """Public endpoint to get current rate limit status for the requesting IP, now also includes server costs and app status."""
     client_ip = get_client_ip(request)
-    today = datetime.now().strftime("%Y-%m-%d")
-    key = f"{client_ip}:{today}"
-    
-    with storage_lock:
-        current_requests = daily_requests.get(key, 0)
-        is_blocked = client_ip in blocked_ips
+    current_requests = await counter_store_call(get_daily_count, client_ip)
+    is_blocked = await counter_store_call(is_ip_blocked, client_ip)
 
-    # Fetch costs (Railway API integration)
-    logger.info("Fetching Railway usage for rate-limit-info endpoint")
-    usage_data = await fetch_railway_usage()
-    
-    if usage_data:
-        logger.info(f"Usage data received, calculating costs")
-        costs = calculate_costs(usage_data)
-    else:
-        logger.warning("No usage data available, returning zero costs")
-        costs = {
-            "cpu_cost": 0.0,
-            "memory_cost": 0.0,
-            "network_cost": 0.0,
-            "total_cost": 0.0
-        }
+    # Costs come from the background Railway refresher, never a live request
+    snapshot = cost_snapshot.get()
+    costs = snapshot["costs"]
     
     # Get app status
     app_status = is_app_enabled()
@@ -806,6 +2046,7 @@ async def get_rate_limit_info(request: Request):
         "is_blocked": is_blocked,
         "rate_limit": RATE_LIMIT,
         "costs": costs,
+        "costs_age_seconds": snapshot["age_seconds"],
         "app_status": app_status
     }
     
@@ -813,7 +2054,8 @@ async def get_rate_limit_info(request: Request):
     if costs["total_cost"] == 0.0:
         response_data["debug"] = {
             "railway_api_configured": bool(RAILWAY_API_TOKEN and RAILWAY_PROJECT_ID),
-            "usage_data_received": bool(usage_data),
+            "usage_data_received": snapshot["usage_data_received"],
+            "costs_fetched_at": snapshot["fetched_at"],
             "timestamp": datetime.utcnow().isoformat()
         }
     
@@ -863,7 +2105,9 @@ async def debug_railway_costs():
             "token_length": len(RAILWAY_API_TOKEN) if RAILWAY_API_TOKEN else 0,
             "project_id": RAILWAY_PROJECT_ID if RAILWAY_PROJECT_ID else "Not set"
         },
-        "pricing": RAILWAY_PRICING
+        "pricing": RAILWAY_PRICING,
+        "cached_snapshot": cost_snapshot.get(),
+        "poll_interval_seconds": RAILWAY_POLL_INTERVAL
     }
     
     # Try to fetch usage data
@@ -943,6 +2187,10 @@ async def kofi_webhook(request: Request):
             
             logger.info(f"Donation stored: {donor_name} - ${amount}")
             
+            # A donation can re-enable the app immediately; the SQLite lookup
+            # runs off the event loop like the background refresher's
+            await asyncio.to_thread(app_gate.recompute)
+            
         except Exception as e:
             logger.error(f"Error storing donation: {e}")
             raise HTTPException(status_code=500, detail="Error storing donation")
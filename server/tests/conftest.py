@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Server modules are imported as top-level modules, as the server itself does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,132 @@
+import queue
+import threading
+import time
+
+import torch
+
+from ormbg.batching import MicroBatcher
+
+
+def slow_forward(im_tensor):
+    time.sleep(0.002)
+    return im_tensor[:, :1] * 2
+
+
+def test_batches_concurrent_submits():
+    batcher = MicroBatcher(slow_forward, max_batch_size=4, max_wait_ms=50)
+    results = [None] * 4
+
+    def submit(i):
+        results[i] = batcher.submit(torch.full((1, 3, 8, 8), float(i)))
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+
+    for i, result in enumerate(results):
+        assert result.shape == (1, 1, 8, 8) and result.eq(2 * i).all()
+    stats = batcher.stats()
+    assert stats["images"] == 4 and stats["batches"] < 4
+
+
+def test_close_while_submitting_never_hangs():
+    # Submits racing close() are either batched or run inline, never lost
+    for _ in range(20):
+        batcher = MicroBatcher(slow_forward, max_batch_size=2, max_wait_ms=1)
+        done = []
+
+        def submit():
+            for _ in range(5):
+                batcher.submit(torch.ones(1, 3, 4, 4))
+            done.append(True)
+
+        threads = [threading.Thread(target=submit, daemon=True) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        batcher.close()
+        for thread in threads:
+            thread.join(timeout=5)
+        assert len(done) == 4
+
+
+
+class SlowPutQueue(queue.Queue):
+    # Widens the gap between submit()'s closed check and its put
+    def put(self, item, *args, **kwargs):
+        if item is not None:
+            time.sleep(0.05)
+        super().put(item, *args, **kwargs)
+
+
+def test_close_between_check_and_put(monkeypatch):
+    monkeypatch.setattr(queue, "Queue", SlowPutQueue)
+    batcher = MicroBatcher(slow_forward, max_batch_size=2, max_wait_ms=1)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(batcher.submit(torch.ones(1, 3, 4, 4))), daemon=True)
+    thread.start()
+    time.sleep(0.01)
+    batcher.close()
+    thread.join(timeout=5)
+    assert len(results) == 1
+
+
+class ConcurrencyProbe:
+    def __init__(self, forward, delay=0.05):
+        self.forward = forward
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def __call__(self, im_tensor):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            return self.forward(im_tensor)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def run_concurrently(func, callers):
+    threads = [threading.Thread(target=func) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_max_concurrent_runs_batches_in_parallel():
+    probe = ConcurrencyProbe(slow_forward)
+    batcher = MicroBatcher(probe, max_batch_size=2, max_wait_ms=5, max_concurrent=4)
+    run_concurrently(lambda: batcher.submit(torch.ones(1, 3, 4, 4)), 8)
+    batcher.close()
+    assert probe.max_in_flight == 4
+    assert batcher.stats()["images"] == 8
+
+
+def test_batching_keeps_every_pool_worker_busy(tmp_path):
+    from PIL import Image
+
+    from ormbg.ormbg import ORMBG
+    from ormbg.ormbg_processor import ORMBGProcessor
+
+    torch.manual_seed(0)
+    model_path = tmp_path / "ormbg.pth"
+    torch.save(ORMBG().state_dict(), model_path)
+    processor = ORMBGProcessor(str(model_path))
+    processor.enable_worker_pool(num_workers=2, max_batch_size=2, max_size=64)
+    processor.enable_batching(max_batch_size=2, max_wait_ms=5)
+    probe = ConcurrencyProbe(processor.pool.run, delay=0.1)
+    processor.pool.run = probe
+    try:
+        image = Image.new("RGB", (64, 48), (200, 100, 50))
+        run_concurrently(lambda: processor.predict_mask(image, 64), 8)
+    finally:
+        processor.close()
+    assert probe.max_in_flight == 2
@@ -0,0 +1,117 @@
+import threading
+
+import pytest
+
+from counter_store import KEEP_DAYS, MemoryCounterStore, RedisCounterStore
+
+try:
+    import fakeredis
+except ImportError:  # test-only dependency, not in requirements.txt
+    fakeredis = None
+
+needs_fakeredis = pytest.mark.skipif(fakeredis is None, reason="fakeredis is not installed")
+
+DAY = 740000
+
+
+@pytest.fixture(params=["memory", pytest.param("redis", marks=needs_fakeredis)])
+def store(request):
+    if request.param == "memory":
+        return MemoryCounterStore()
+    return RedisCounterStore(client=fakeredis.FakeRedis())
+
+
+def test_track_counts_per_ip_and_day(store):
+    assert store.track("1.2.3.4", DAY) == (False, 1)
+    assert store.track("1.2.3.4", DAY) == (False, 2)
+    assert store.track("1.2.3.4", DAY + 1) == (False, 1)
+    assert store.track("::1", DAY) == (False, 1)
+    assert store.get_count("1.2.3.4", DAY) == 2
+    assert store.get_count("5.6.7.8", DAY) == 0
+
+
+def test_block_and_unblock(store):
+    store.track("1.2.3.4", DAY)
+    store.block("1.2.3.4")
+    assert store.is_blocked("1.2.3.4")
+    assert store.blocked_ips() == ["1.2.3.4"]
+    # Blocked IPs are still counted
+    assert store.track("1.2.3.4", DAY) == (True, 2)
+
+    assert store.unblock("1.2.3.4")
+    assert not store.unblock("1.2.3.4")
+    assert not store.is_blocked("1.2.3.4")
+    assert store.blocked_ips() == []
+    assert store.track("1.2.3.4", DAY) == (False, 3)
+
+
+def test_day_stats(store):
+    for ip, count in (("10.0.0.1", 5), ("10.0.0.2", 3), ("10.0.0.3", 1)):
+        for _ in range(count):
+            store.track(ip, DAY)
+    store.track("10.0.0.1", DAY + 1)
+
+    stats = store.day_stats(DAY, top_n=2)
+    assert stats["ips"] == 3
+    assert stats["total"] == 9
+    assert stats["top"] == [("10.0.0.1", 5), ("10.0.0.2", 3)]
+    assert store.day_stats(DAY - 1) == {"ips": 0, "total": 0, "top": []}
+
+
+def test_concurrent_track_loses_no_counts(store):
+    # The block check and the increment are one atomic call per request
+    store.block("10.0.0.9")
+    results = []
+
+    def worker():
+        for _ in range(50):
+            results.append(store.track("10.0.0.9", DAY))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert store.get_count("10.0.0.9", DAY) == 400
+    assert sorted(count for _, count in results) == list(range(1, 401))
+    assert all(blocked for blocked, _ in results)
+
+
+def test_memory_store_expires_old_days():
+    store = MemoryCounterStore()
+    store.track("1.2.3.4", DAY)
+    store.cleanup(DAY + KEEP_DAYS)
+    assert store.get_count("1.2.3.4", DAY) == 1
+    store.cleanup(DAY + KEEP_DAYS + 1)
+    assert store.get_count("1.2.3.4", DAY) == 0
+    assert store.day_stats(DAY)["total"] == 0
+
+
+@needs_fakeredis
+def test_redis_store_keys_expire():
+    client = fakeredis.FakeRedis()
+    store = RedisCounterStore(client=client, prefix="test:")
+    store.track("1.2.3.4", DAY)
+    for key in (f"test:daily:{DAY}:1.2.3.4", f"test:day:{DAY}", f"test:total:{DAY}"):
+        assert 0 < client.ttl(key) <= store.ttl_seconds
+    assert store.ttl_seconds > KEEP_DAYS * 24 * 3600
+    # The block list is permanent until an admin unblocks
+    store.block("1.2.3.4")
+    assert client.ttl("test:blocked") == -1
+
+
+@needs_fakeredis
+def test_redis_track_is_one_transaction():
+    client = fakeredis.FakeRedis()
+    store = RedisCounterStore(client=client)
+    pipelines = []
+    pipeline = client.pipeline
+
+    def recording_pipeline(transaction=True):
+        pipelines.append(transaction)
+        return pipeline(transaction=transaction)
+
+    client.pipeline = recording_pipeline
+    store.track("1.2.3.4", DAY)
+    assert pipelines == [True]
@@ -0,0 +1,58 @@
+import numpy as np
+from PIL import Image
+
+from guided_filter import refine_mask
+
+
+def edge_image(size, edge):
+    # Black left of column `edge`, white from it on
+    pixels = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+    pixels[:, edge:] = 255
+    return Image.fromarray(pixels)
+
+
+def test_refine_mask_returns_image_size():
+    image = edge_image((1200, 800), 600)
+    mask = Image.new("L", (300, 200), 128)
+    assert refine_mask(image, mask, 1.0).size == (1200, 800)
+    assert refine_mask(image, mask, 0.0).size == (1200, 800)
+
+
+def test_refine_mask_follows_full_resolution_edge():
+    # The low-res mask has a soft edge; the refined mask should snap to the
+    # sharp edge of the full-resolution image, unlike a bilinear upscale
+    image = edge_image((1600, 400), 803)
+    mask = edge_image((200, 50), 100).convert("L").resize((50, 12), Image.BILINEAR).resize((200, 50))
+
+    refined = np.asarray(refine_mask(image, mask, 1.0, radius=4), dtype=np.float32)
+    upscaled = np.asarray(mask.resize(image.size, Image.BILINEAR), dtype=np.float32)
+    truth = np.asarray(image.convert("L"), dtype=np.float32)
+
+    band = slice(740, 870)
+    assert np.abs(refined - truth)[:, band].mean() < np.abs(upscaled - truth)[:, band].mean()
+    # A step across the real edge, where the upscale only ramps
+    assert refined[:, 805].mean() - refined[:, 800].mean() > 150
+    assert upscaled[:, 805].mean() - upscaled[:, 800].mean() < 50
+
+
+def test_refine_mask_strength_blends_with_upscale():
+    image = edge_image((400, 400), 200)
+    mask = Image.new("L", (100, 100), 100)
+    full = np.asarray(refine_mask(image, mask, 1.0), dtype=np.float32)
+    half = np.asarray(refine_mask(image, mask, 0.5), dtype=np.float32)
+    assert np.allclose(half, (full + 100) / 2, atol=1)
+
+
+def test_refine_mask_bands_match_single_pass():
+    rng = np.random.RandomState(0)
+    image = Image.fromarray(rng.randint(0, 255, (300, 500, 3), np.uint8))
+    mask = Image.fromarray(rng.randint(0, 255, (120, 200), np.uint8))
+    for strength in (1.0, 0.5):
+        single = np.asarray(refine_mask(image, mask, strength, working_size=64), dtype=int)
+        banded = np.asarray(refine_mask(image, mask, strength, working_size=64, max_bytes=1), dtype=int)
+        assert np.array_equal(single, banded)
+        # The blend partner is the bilinear upscale of the mask itself
+        full = np.asarray(refine_mask(image, mask, 1.0, working_size=64), dtype=np.float32)
+        upscaled = np.asarray(mask.resize(image.size, Image.BILINEAR), dtype=np.float32)
+        expected = upscaled + (full - upscaled) * strength
+        assert np.abs(single - expected).mean() < 1
@@ -0,0 +1,31 @@
+import io
+
+import pytest
+from PIL import Image
+
+from image_decode import decode_upload
+
+
+def encode(fmt, size=(2000, 1500)):
+    with io.BytesIO() as output:
+        Image.new("RGB", size, (120, 30, 200)).save(output, fmt)
+        return output.getvalue()
+
+
+@pytest.mark.parametrize("fmt", ["PNG", "WEBP"])
+def test_decode_upload_shares_one_full_decode(fmt):
+    model_image, full_image = decode_upload(encode(fmt), 512, need_full=True)
+    assert full_image.size == (2000, 1500) and full_image.mode == "RGB"
+    # Reduced by an integer factor, still covering the 512 letterbox
+    assert model_image.size == (667, 500)
+
+
+def test_decode_upload_jpeg_uses_draft():
+    model_image, full_image = decode_upload(encode("JPEG"), 512, need_full=True)
+    assert full_image is None
+    assert 512 <= model_image.width < 2000
+
+
+def test_decode_upload_without_full():
+    model_image, full_image = decode_upload(encode("PNG"), 512, need_full=False)
+    assert full_image is None and model_image.size == (667, 500)
@@ -0,0 +1,26 @@
+import torch
+
+from ormbg.ormbg import ORMBG
+from ormbg.ormbg_processor import ORMBGProcessor
+
+
+def test_profiling_samples_eager_net_of_traced_model(tmp_path):
+    torch.manual_seed(0)
+    model_path = tmp_path / "ormbg.pth"
+    torch.save(ORMBG().state_dict(), model_path)
+    processor = ORMBGProcessor(str(model_path))
+    processor.optimize(mode="trace", warmup_sizes=(64,))
+    processor.enable_profiling(sample_rate=1.0)
+
+    im_tensor = torch.rand(1, 3, 64, 64)
+    sampled = processor.predict(im_tensor)
+    stats = processor.profiler.stats()
+    assert stats["passes"] == 1
+    assert {"conv_in", "stage1", "side1", "total"} <= set(stats["input_sizes"]["64"])
+
+    # Unsampled passes keep the traced graph and give the same mask
+    processor.profiler.sample_rate = 0.0
+    traced = processor.predict(im_tensor)
+    assert processor.profiler.stats()["passes"] == 1
+    torch.testing.assert_close(sampled, traced, rtol=1e-4, atol=1e-5)
+    processor.close()
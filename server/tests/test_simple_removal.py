@@ -0,0 +1,65 @@
+from collections import deque
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from simple_removal import border_connected, classify_plain_background, color_key_mask, simple_background_mask
+
+
+def naive_border_connected(candidate):
+    # Reference BFS from every border candidate, 4-connectivity
+    h, w = candidate.shape
+    reached = np.zeros_like(candidate)
+    queue = deque()
+    for y in range(h):
+        for x in range(w):
+            if candidate[y, x] and (y in (0, h - 1) or x in (0, w - 1)):
+                reached[y, x] = True
+                queue.append((y, x))
+    while queue:
+        y, x = queue.popleft()
+        for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+            if 0 <= ny < h and 0 <= nx < w and candidate[ny, nx] and not reached[ny, nx]:
+                reached[ny, nx] = True
+                queue.append((ny, nx))
+    return reached
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_border_connected_matches_bfs(seed):
+    rng = np.random.default_rng(seed)
+    h, w = rng.integers(1, 40, size=2)
+    candidate = rng.random((h, w)) < rng.uniform(0.3, 0.8)
+    np.testing.assert_array_equal(border_connected(candidate), naive_border_connected(candidate))
+
+
+@pytest.mark.parametrize("corner", [(0, 0), (0, -1), (-1, 0), (-1, -1)])
+def test_border_connected_foreground_corner(corner):
+    candidate = np.ones((30, 50), dtype=bool)
+    candidate[10:20, 20:30] = False
+    candidate[corner] = False
+    np.testing.assert_array_equal(border_connected(candidate), naive_border_connected(candidate))
+
+
+def test_flood_fill_subject_in_bottom_right_corner():
+    rgb = np.full((60, 90, 3), 255, dtype=np.uint8)
+    rgb[20:40, 30:60] = 20
+    rgb[-10:, -10:] = 20
+    alpha = np.asarray(simple_background_mask(Image.fromarray(rgb), flood_fill=True))
+    assert alpha[0, 0] == 0
+    assert alpha[30, 45] == 255
+    assert alpha[-1, -1] == 255
+
+
+def test_color_key_subject_in_bottom_right_corner():
+    # White 900x600 product shot with a dark 20x20 block in the bottom-right corner
+    rgb = np.full((600, 900, 3), 255, dtype=np.uint8)
+    rgb[200:400, 350:550] = 30
+    rgb[-20:, -20:] = 30
+    color, border_fraction = classify_plain_background(rgb)
+    assert border_fraction > 0.9
+    alpha = color_key_mask(rgb, color)
+    assert alpha[0, 0] == 0 and alpha[100, 100] == 0
+    assert alpha[300, 450] == 255
+    assert (alpha[-20:, -20:] == 255).all()
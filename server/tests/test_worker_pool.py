@@ -0,0 +1,41 @@
+import threading
+
+import pytest
+import torch
+
+from ormbg.ormbg import ORMBG
+from ormbg.worker_pool import ORMBGWorkerPool
+
+
+@pytest.fixture(scope="module")
+def pool():
+    torch.manual_seed(0)
+    net = ORMBG().eval()
+    net.inference_only = True
+    pool = ORMBGWorkerPool(net, num_workers=1, max_size=64)
+    yield pool
+    pool.close()
+
+
+def test_run_returns_masks(pool):
+    assert pool.run(torch.rand(1, 3, 64, 64)).shape == (1, 1, 64, 64)
+
+
+def test_run_racing_close_does_not_hang(pool):
+    # close() has taken the only idle worker after run() passed its closed check
+    worker = pool._idle.get()
+    errors = []
+
+    def run():
+        try:
+            pool.run(torch.rand(1, 3, 64, 64))
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    pool._closed = True
+    thread.join(timeout=5)
+    pool._idle.put(worker)
+    assert not thread.is_alive()
+    assert "closed" in str(errors[0])